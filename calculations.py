@@ -5,9 +5,12 @@ This file contains functions for performing calculations on our stored data.
 This file is Copyright (c) 2025 Skye Mah-Madjar, Krisztian Drimba, Joshua Iaboni, and Xiayu Lyu.
 """
 
+import heapq
 from typing import Any
 from random import choice
-from graph_entities import Graph
+import numpy as np
+from graph_entities import MOVIE_INFO_INDEX, Graph
+from calculations_fast import pack_rows, transpose
 
 
 #######################################################################################################################
@@ -41,25 +44,40 @@ def bacon_path(graph: Graph, actors: tuple[str, str], movies: dict = None, key:
     if actor1 not in other_actors or actor2 not in other_actors:
         raise ValueError("At least one of these is not a valid name OR is not in our dataset.")
 
-    path = graph.shortest_path_bfs(actor1, actor2)
-    path_with_movies = []
-
-    if key in {'rating', 'release date'}:
+    if key in MOVIE_INFO_INDEX:
         lower, upper = thresholds[0], thresholds[1]
         path = graph.shortest_path_bfs_filtered((actor1, actor2), key, (lower, upper), movies)
-        path_with_movies = []
+    else:
+        path = graph.shortest_path_bfs(actor1, actor2)
+
+    if not path:
+        return [], []
+
+    return path, attach_movies(graph, path)
+
+
+def attach_movies(graph: Graph, path: list[str]) -> list:
+    """Return the given non-empty path of actors with the set of movies shared by each consecutive pair of
+    actors inserted between them.
+
+    >>> g = Graph()
+    >>> g.add_vertex('Kevin Bacon', 'actor')
+    >>> g.add_vertex('John Cena', 'actor')
+    >>> g.add_appearances('Kevin Bacon', 'Movie')
+    >>> g.add_appearances('John Cena', 'Movie')
+    >>> attach_movies(g, ['Kevin Bacon', 'John Cena'])
+    ['Kevin Bacon', {'Movie'}, 'John Cena']
+    """
+    path_with_movies = []
 
     for i in range(len(path) - 1):
         path_with_movies.append(path[i])  # Add actor
         movies_between = graph.get_common_movies(path[i], path[i + 1])  # Get shared movies
         path_with_movies.append(movies_between)  # Add movie(s)
 
-    if not path:
-        return [], []
-
     path_with_movies.append(path[-1])  # Add final actor
 
-    return path, path_with_movies
+    return path_with_movies
 
 
 def print_bacon_path(graph: Graph, actors: tuple[str, str], movies: dict = None, key: str = '',
@@ -80,13 +98,7 @@ def print_bacon_path(graph: Graph, actors: tuple[str, str], movies: dict = None,
     lower, upper = thresholds[0], thresholds[1]
     _, path = bacon_path(graph, (actor1, actor2), movies, key, (lower, upper))
 
-    formatted_path = []
-
-    for item in path:
-        if isinstance(item, set):
-            formatted_path.append(f"[{', '.join(item)}]")
-        else:
-            formatted_path.append(item)
+    formatted_path = [f"[{', '.join(item)}]" if isinstance(item, set) else item for item in path]
 
     print(" -->> ".join(formatted_path))
 
@@ -95,6 +107,8 @@ def bacon_number(graph: Graph, actors: tuple[str, str], movies: dict = None, key
                  thresholds: tuple[float, float] = (0, 0)) -> int:
     """Given the name of two actors, calculate their bacon number (the shortest path between them).
 
+    Unfiltered queries involving an actor passed to graph.precompute_distances_from are answered without searching.
+
     >>> g = Graph()
     >>> g.add_vertex('Kevin Bacon', 'actor')
     >>> g.add_vertex('John Cena', 'actor')
@@ -105,6 +119,9 @@ def bacon_number(graph: Graph, actors: tuple[str, str], movies: dict = None, key
     0
     >>> bacon_number(g, ('Kevin Bacon', 'Dwayne Johnson'))
     2
+    >>> g.precompute_distances_from('Kevin Bacon')
+    >>> bacon_number(g, ('Dwayne Johnson', 'Kevin Bacon'))
+    2
     """
     if movies is None:
         movies = {}
@@ -115,9 +132,39 @@ def bacon_number(graph: Graph, actors: tuple[str, str], movies: dict = None, key
     if actor1 not in other_actors or actor2 not in other_actors:
         raise ValueError("At least one of these is not a valid name OR is not in our dataset.")
 
-    lower, upper = thresholds[0], thresholds[1]
-    path, _ = bacon_path(graph, (actor1, actor2), movies, key, (lower, upper))
-    return len(path) - 1
+    if key in MOVIE_INFO_INDEX:
+        lower, upper = thresholds[0], thresholds[1]
+        return len(graph.shortest_path_bfs_filtered((actor1, actor2), key, (lower, upper), movies)) - 1
+
+    distance = graph.precomputed_distance(actor1, actor2)
+    if distance is not None:
+        return distance
+
+    return graph.shortest_distance_to(actor1, actor2)
+
+
+def bacon_numbers_batch(graph: Graph, actor: str, others: list[str]) -> list[int]:
+    """Given the name of an actor, calculate their bacon number with each of the actors in others, in order
+    (-1 where there is no path).
+
+    All of them are answered by a single breadth-first search from actor, so prefer this over calling
+    bacon_number repeatedly with the same first actor.
+
+    >>> g = Graph()
+    >>> g.add_vertex('Kevin Bacon', 'actor')
+    >>> g.add_vertex('John Cena', 'actor')
+    >>> g.add_vertex('Dwayne Johnson', 'actor')
+    >>> g.add_edge('Kevin Bacon', 'John Cena')
+    >>> g.add_edge('John Cena', 'Dwayne Johnson')
+    >>> bacon_numbers_batch(g, 'Kevin Bacon', ['Dwayne Johnson', 'John Cena'])
+    [2, 1]
+    """
+    other_actors = graph.get_all_vertices('actor')
+
+    if actor not in other_actors or any(other not in other_actors for other in others):
+        raise ValueError("At least one of these is not a valid name OR is not in our dataset.")
+
+    return graph.bacon_numbers_from(actor, others)
 
 
 def average_bacon_number(graph: Graph, actor: str) -> float:
@@ -136,42 +183,112 @@ def average_bacon_number(graph: Graph, actor: str) -> float:
     if actor not in graph.get_all_vertices('actor'):
         raise ValueError("This is not a valid name OR this actor is not in our dataset.")
 
-    distances = graph.shortest_distance_bfs(actor)
-
-    total_distance = sum(dist for dist in distances.values() if dist != float("inf"))
-    total_reachable = sum(1 for dist in distances.values() if dist != float("inf"))
-
-    return total_distance / total_reachable if total_reachable > 0 else float("inf")
+    return graph.average_distance(actor)
 
 
 def compute_average_bacon_numbers(graph: Graph) -> dict:
     """Compute the average Bacon number for every actor in the graph and store it in a dictionary.
-    """
-    actors = graph.get_all_vertices('actor')
-    averages = {}
-
-    for actor in actors:
-        averages[actor] = average_bacon_number(graph, actor)
 
-    return averages
+    The breadth-first searches from every actor run in parallel over the frozen graph.
+    """
+    return graph.average_distances('actor')
 
 
 def ranking(data: dict[str, float], limit: int) -> None:
     """Print out the ranking of <limit> actors based on their average bacon numbers.
+
+    Lower average bacon numbers rank higher, and actors with equal averages keep their order in data.
+
+    >>> ranking({'a': 2.5, 'b': 1.5, 'c': 0, 'd': 2.0}, 2)
+    1 : b with average bacon number: 1.5
+    2 : d with average bacon number: 2.0
     """
-    i = 0
-    for actor, avg in data.items():
-        if i == limit:
-            return
-        if avg > 0:
-            print(i + 1, ":", actor, "with average bacon number:", avg)
-            i += 1
+    positive = ((name, score) for name, score in data.items() if score > 0)
+    for rank, (actor, avg) in enumerate(heapq.nsmallest(limit, positive, key=lambda item: item[1]), start=1):
+        print(rank, ":", actor, "with average bacon number:", avg)
 
 
 #######################################################################################################################
 # Movie Similarity
 #######################################################################################################################
 
+def build_cast_matrix(movies: dict) -> tuple[np.ndarray, np.ndarray, list[str]]:
+    """Return the binary movie-by-actor cast membership matrix of the given movies in CSR form, as its indptr and
+    indices arrays, along with the list of movies in row order.
+
+    Actors are numbered in the order they are first seen. The actor ids of the cast of movie_list[i] are
+    indices[indptr[i]:indptr[i + 1]].
+
+    >>> indptr, indices, movie_list = build_cast_matrix({'m1': ({'a', 'b'}, (1990, 10, 5.0)), \
+    'm2': ({'b'}, (2000, 10, 6.0))})
+    >>> movie_list
+    ['m1', 'm2']
+    >>> indptr.tolist()
+    [0, 2, 3]
+    """
+    movie_list = list(movies)
+    actor_ids = {}
+    rows = [[actor_ids.setdefault(actor, len(actor_ids)) for actor in movies[movie][0]] for movie in movie_list]
+    indptr, indices = pack_rows(rows)
+    return indptr, indices, movie_list
+
+
+def build_movie_table(movies: dict) -> dict:
+    """Return the given movies laid out as NumPy arrays, indexed by each movie's position in movies.
+
+    The returned dictionary holds:
+        - 'ids': a dictionary mapping each movie to its index
+        - 'names': the list of movies, in index order
+        - each key in MOVIE_INFO_INDEX: the value of that key for each movie
+        - 'cast_indptr', 'cast_indices': the cast membership matrix, as returned by build_cast_matrix
+        - 'roles_indptr', 'roles_indices': its transpose, i.e. the movies each actor appeared in
+        - 'cast_sizes': the number of cast members of each movie
+
+    The table is a snapshot of movies: build a new one after movies is mutated.
+
+    >>> table = build_movie_table({'m1': ({'a', 'b'}, ('1990', '10', '5.0')), 'm2': ({'b'}, ('2000', '10', '6.0'))})
+    >>> table['ids']['m2'], table['cast_sizes'].tolist()
+    (1, [2, 1])
+    """
+    cast_indptr, cast_indices, movie_list = build_cast_matrix(movies)
+    n_actors = int(cast_indices.max()) + 1 if cast_indices.size > 0 else 0
+    roles_indptr, roles_indices = transpose(cast_indptr, cast_indices, n_actors)
+
+    return {
+        'ids': {movie: i for i, movie in enumerate(movie_list)},
+        'names': movie_list,
+        **{key: np.array([float(movies[movie][1][i]) for movie in movie_list])
+           for key, i in MOVIE_INFO_INDEX.items()},
+        'cast_indptr': cast_indptr,
+        'cast_indices': cast_indices,
+        'roles_indptr': roles_indptr,
+        'roles_indices': roles_indices,
+        'cast_sizes': np.diff(cast_indptr)
+    }
+
+
+def _similarity_scores(table: dict, idx: int) -> np.ndarray:
+    """Return the similarity score between the movie with index idx and every movie in table, as an array.
+
+    This is the Jaccard similarity of the cast membership matrix rows: the size of the intersection of the two
+    casts divided by the size of their union. Only the movies of the given movie's cast members are touched
+    to count intersections. The given movie's score with itself is set to 0.
+    """
+    cast = table['cast_indices'][table['cast_indptr'][idx]:table['cast_indptr'][idx + 1]]
+    roles_indptr, roles_indices = table['roles_indptr'], table['roles_indices']
+    shared = [roles_indices[roles_indptr[actor]:roles_indptr[actor + 1]] for actor in cast.tolist()]
+
+    sizes = table['cast_sizes']
+    intersection = np.bincount(np.concatenate(shared) if shared else np.empty(0, dtype=np.int32),
+                               minlength=sizes.size)
+    union = sizes + sizes[idx] - intersection
+
+    scores = np.zeros(sizes.size)
+    np.divide(intersection, union, out=scores, where=union > 0)
+    scores[idx] = 0
+    return scores
+
+
 def get_similarity_score_dict(movies: dict, movie1: str, movie2: str) -> float:
     """Returns the similarity score between two movies based on dividing the intersection of their cast members
     by the union of their cast members.
@@ -179,12 +296,12 @@ def get_similarity_score_dict(movies: dict, movie1: str, movie2: str) -> float:
     if movie1 not in movies or movie2 not in movies:
         raise ValueError("At least one of these is not a valid name OR is not in our dataset.")
 
-    if movies[movie1][0] == set() or movies[movie2][0] == set():
+    cast1, cast2 = movies[movie1][0], movies[movie2][0]
+    if not cast1 or not cast2:
         return 0
 
-    sim_intersection = movies[movie1][0].intersection(movies[movie2][0])
-    sim_union = movies[movie1][0].union(movies[movie2][0])
-    return len(sim_intersection) / len(sim_union)
+    sim_intersection = len(cast1 & cast2)
+    return sim_intersection / (len(cast1) + len(cast2) - sim_intersection)
 
 
 def get_recommendations(movies: dict, input_movie: Any, limit: int, key: str = '',
@@ -193,46 +310,85 @@ def get_recommendations(movies: dict, input_movie: Any, limit: int, key: str = '
     """Get movie recommendations given an input movie using the similarity score algorithm
     (intersection of cast / union of cast).
 
+    This builds build_movie_table(movies) for this call only. To answer repeated queries, build the table once
+    and call get_recommendations_from_table instead.
+
+    Return the same values as get_recommendations_from_table.
+
     Preconditions:
     - key in {'rating', 'release date'} or key == ''
+
+    >>> movies = {'m1': ({'a', 'b'}, ('1990', '10', '5.0')), 'm2': ({'b'}, ('2000', '10', '6.0')), \
+    'm3': ({'c'}, ('2010', '10', '7.0'))}
+    >>> get_recommendations(movies, 'm1', 5)
+    (['m2'], {'m2': 0.5})
+    >>> get_recommendations(movies, 'm1', 5, 'release date', (1995, 2005))
+    ({'m2': 2000}, {'m2': 0.5})
     """
     if input_movie not in movies:
         raise ValueError("This is not a valid name OR this movie is not in our dataset.")
 
-    recommendations = {}
+    return get_recommendations_from_table(build_movie_table(movies), input_movie, limit, key, thresholds)
 
-    if key == '':
-        for movie in movies:
-            sim_score = get_similarity_score_dict(movies, input_movie, movie)
-            if movie != input_movie and sim_score > 0:
-                recommendations[movie] = sim_score
 
-        sorted_recommendations = sorted(recommendations, key=recommendations.get, reverse=True)
-        return sorted_recommendations[:limit], recommendations
+def get_recommendations_from_table(table: dict, input_movie: Any, limit: int, key: str = '',
+                                   thresholds: tuple[float, float] = (0, 0)) \
+        -> (tuple[dict[Any, Any], dict[str, float]] | tuple[list[Any], dict[str, float]]):
+    """Get movie recommendations given an input movie using the similarity score algorithm, with the scores
+    against every movie computed at once from the cast membership matrix in table = build_movie_table(movies).
+
+    Return the top limit recommendations (as a list, or as a dictionary mapping each to its rating or release
+    year when filtering), along with a dictionary mapping each of them to its similarity score. Only the returned
+    recommendations are in that dictionary, not every movie with a positive score.
+
+    Preconditions:
+    - key in {'rating', 'release date'} or key == ''
+    """
+    if input_movie not in table['ids']:
+        raise ValueError("This is not a valid name OR this movie is not in our dataset.")
+
+    scores = _similarity_scores(table, table['ids'][input_movie])
+    names = table['names']
 
-    if key in {'rating', 'release date'}:
-        for movie in movies:
-            sim_score = get_similarity_score_dict(movies, input_movie, movie)
-            lower, upper = thresholds[0], thresholds[1]
-            if movie != input_movie and similarity_filter(movies, movie, key, lower, upper) and sim_score > 0:
-                recommendations[movie] = sim_score
+    if key == '':
+        top = _top_k(scores, limit)
+        recommendations = {names[i]: float(scores[i]) for i in top.tolist()}
+        return list(recommendations), recommendations
 
-        sorted_recommendations = sorted(recommendations, key=recommendations.get, reverse=True)
+    if key in MOVIE_INFO_INDEX:
+        lower, upper = thresholds[0], thresholds[1]
+        values = table[key]
+        scores[(values < lower) | (values > upper)] = 0
 
-        i = 2 if key == 'rating' else 0
+        top = _top_k(scores, limit).tolist()
+        recommendations = {names[i]: float(scores[i]) for i in top}
 
-        final_recommendations = {}
-        for movie in sorted_recommendations[:limit]:
-            if i == 2:
-                final_recommendations[movie] = float(movies[movie][1][i])
-            elif i == 0:
-                final_recommendations[movie] = int(movies[movie][1][i])
+        convert = int if key == 'release date' else float
+        final_recommendations = {names[i]: convert(values[i]) for i in top}
 
         return final_recommendations, recommendations
 
     raise ValueError
 
 
+def _top_k(scores: np.ndarray, limit: int) -> np.ndarray:
+    """Return the indices of the (at most) limit highest positive scores, from highest to lowest score.
+
+    Ties are broken by lower index first. Only the candidates that can make the cut are sorted.
+
+    >>> _top_k(np.array([0.5, 0.0, 0.25, 0.5, 1.0]), 3).tolist()
+    [4, 0, 3]
+    """
+    candidates = np.flatnonzero(scores > 0)
+    if 0 < limit < candidates.size:
+        # The limit-th highest score; everything below it cannot make the cut
+        cutoff = -np.partition(-scores[candidates], limit - 1)[limit - 1]
+        candidates = candidates[scores[candidates] >= cutoff]
+
+    order = np.argsort(-scores[candidates], kind='stable')[:max(limit, 0)]
+    return candidates[order]
+
+
 def similarity_filter(movies: dict, input_movie: str, key: str, lower: float, upper: float) -> bool:
     """Returns whether the given movie's info is within the given bound.
 
@@ -242,13 +398,11 @@ def similarity_filter(movies: dict, input_movie: str, key: str, lower: float, up
     if input_movie not in movies:
         raise ValueError("This is not a valid name OR this movie is not in our dataset.")
 
-    if key == 'rating':
-        return lower <= float(movies[input_movie][1][2]) <= upper
-    elif key == 'release date':
-        return lower <= float(movies[input_movie][1][0]) <= upper
-    else:
+    if key not in MOVIE_INFO_INDEX:
         raise KeyError
 
+    return lower <= float(movies[input_movie][1][MOVIE_INFO_INDEX[key]]) <= upper
+
 
 #######################################################################################################################
 # Extra Functions
@@ -292,7 +446,7 @@ if __name__ == '__main__':
 
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['graph_entities', 'graph_create', 'random'],
+        'extra-imports': ['graph_entities', 'graph_create', 'random', 'heapq', 'numpy', 'calculations_fast'],
         'allowed-io': ['print_bacon_path', 'ranking'],
         'max-line-length': 120
     })
@@ -0,0 +1,612 @@
+"""HAM and Bacon - calculations_fast.py
+
+This file contains functions for building Compressed Sparse Row (CSR) arrays, and Numba-compiled kernels for
+searching and laying out a graph stored in that form, i.e. the indptr and indices arrays of a frozen Graph.
+Vertices are referred to by their integer ids.
+
+This file is Copyright (c) 2025 Skye Mah-Madjar, Krisztian Drimba, Joshua Iaboni, and Xiayu Lyu.
+"""
+
+import numpy as np
+from numba import njit, prange
+
+# The distance reported for vertices that cannot be reached from the source.
+UNREACHED = -1
+
+# The number of chunks all_bacon_avgs splits its sources into, comfortably more than the number of cores so
+# that the work stays balanced between threads.
+SOURCE_CHUNKS = 256
+
+# The number of sources all_bacon_avgs searches at once, one per bit of a uint64 word.
+BATCH_WIDTH = 64
+
+# A de Bruijn sequence, and the table mapping the top six bits of its product with a power of two back to the
+# exponent, used to find the lowest set bit of a word.
+_DEBRUIJN = np.uint64(0x03F79D71B4CB0A89)
+_DEBRUIJN_BITS = np.argsort([((1 << b) * 0x03F79D71B4CB0A89 % 2 ** 64) >> 58 for b in range(64)])
+
+# The body of a Barnes-Hut quadtree cell holding no vertices, one split into children, and one too small to split
+# holding several vertices. Cells holding a single vertex store its id instead.
+QUAD_EMPTY = -1
+QUAD_INTERNAL = -2
+QUAD_MERGED = -3
+
+# The size of the stack forceatlas2_layout walks a quadtree with, enough for any tree _build_quadtree builds.
+QUAD_STACK_SIZE = 4 * 64
+
+
+def pack_rows(rows: list[list[int]]) -> tuple[np.ndarray, np.ndarray]:
+    """Return the CSR indptr and indices arrays holding the given rows of integers, with each row sorted."""
+    degrees = np.fromiter((len(row) for row in rows), dtype=np.int32, count=len(rows))
+    indptr = np.zeros(len(rows) + 1, dtype=np.int32)
+    np.cumsum(degrees, out=indptr[1:])
+
+    indices = np.fromiter((j for row in rows for j in row), dtype=np.int32, count=int(indptr[-1]))
+    row_ids = np.repeat(np.arange(len(rows), dtype=np.int32), degrees)
+    return indptr, indices[np.lexsort((indices, row_ids))]
+
+
+def transpose(indptr: np.ndarray, indices: np.ndarray, n_cols: int) -> tuple[np.ndarray, np.ndarray]:
+    """Return the CSR indptr and indices arrays of the transpose of the given CSR matrix with n_cols columns.
+
+    Each row of the result is sorted.
+    """
+    row_ids = np.repeat(np.arange(indptr.size - 1, dtype=np.int32), np.diff(indptr))
+    order = np.lexsort((row_ids, indices))
+
+    t_indptr = np.zeros(n_cols + 1, dtype=np.int32)
+    np.cumsum(np.bincount(indices, minlength=n_cols), out=t_indptr[1:])
+    return t_indptr, row_ids[order]
+
+
+@njit(cache=True)
+def _walk_parents(parent: np.ndarray, src: int, tgt: int) -> np.ndarray:
+    """Return an int32 array of the vertex ids on the path from src to tgt given by the BFS parent pointers.
+
+    Preconditions:
+        - tgt is src, or following parent from tgt eventually reaches src
+    """
+    length = 1
+    node = tgt
+    while node != src:
+        node = parent[node]
+        length += 1
+
+    path = np.empty(length, dtype=np.int32)
+    node = tgt
+    for k in range(length - 1, -1, -1):
+        path[k] = node
+        node = parent[node]
+
+    return path
+
+
+@njit(cache=True, parallel=True)
+def clique_edges(indptr: np.ndarray, indices: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return the int32 src and dst arrays of the directed edges (a, b) between every two entries a and b at
+    different positions of the same row of the given CSR arrays.
+
+    The pairs of each row are counted first so that every row writes its own slice of the output in parallel.
+
+    >>> src, dst = clique_edges(np.array([0, 3, 4]), np.array([5, 6, 7, 8]))
+    >>> list(zip(src.tolist(), dst.tolist()))
+    [(5, 6), (5, 7), (6, 5), (6, 7), (7, 5), (7, 6)]
+    """
+    n_rows = indptr.size - 1
+    offsets = np.zeros(n_rows + 1, dtype=np.int64)
+    for r in range(n_rows):
+        k = indptr[r + 1] - indptr[r]
+        offsets[r + 1] = offsets[r] + k * (k - 1)
+
+    src = np.empty(offsets[-1], dtype=np.int32)
+    dst = np.empty(offsets[-1], dtype=np.int32)
+    for r in prange(n_rows):
+        o = offsets[r]
+        for a in range(indptr[r], indptr[r + 1]):
+            for b in range(indptr[r], indptr[r + 1]):
+                if a != b:
+                    src[o] = indices[a]
+                    dst[o] = indices[b]
+                    o += 1
+
+    return src, dst
+
+
+@njit(cache=True)
+def sorted_intersect(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Return the sorted array of the values that appear in both a and b, using a two-pointer merge.
+
+    Preconditions:
+        - a and b are sorted and have no repeated values
+
+    >>> sorted_intersect(np.array([1, 3, 4, 7]), np.array([2, 3, 7, 9])).tolist()
+    [3, 7]
+    """
+    out = np.empty(min(a.size, b.size), dtype=a.dtype)
+    i, j, k = 0, 0, 0
+    while i < a.size and j < b.size:
+        if a[i] < b[j]:
+            i += 1
+        elif a[i] > b[j]:
+            j += 1
+        else:
+            out[k] = a[i]
+            k += 1
+            i += 1
+            j += 1
+
+    return out[:k]
+
+
+@njit(cache=True)
+def _new_bitset(n: int) -> np.ndarray:
+    """Return an all-clear bitset with room for n bits, packed into uint64 words."""
+    return np.zeros((n + 63) >> 6, dtype=np.uint64)
+
+
+@njit(cache=True)
+def _test_and_set(bits: np.ndarray, i: int) -> bool:
+    """Set bit i of the given bitset, and return whether it was already set."""
+    word = bits[i >> 6]
+    mask = np.uint64(1) << np.uint64(i & 63)
+    if word & mask:
+        return True
+    bits[i >> 6] = word | mask
+    return False
+
+
+@njit(cache=True)
+def _is_set(bits: np.ndarray, i: int) -> bool:
+    """Return whether bit i of the given bitset is set."""
+    return (bits[i >> 6] >> np.uint64(i & 63)) & np.uint64(1) != 0
+
+
+@njit(cache=True)
+def bfs_distances(indptr: np.ndarray, indices: np.ndarray, src: int, n: int) -> np.ndarray:
+    """Return an int32 array holding the length of a shortest path from src to every one of the n vertices.
+
+    Vertices that cannot be reached from src have distance UNREACHED.
+
+    Preconditions:
+        - 0 <= src < n
+        - indptr.size == n + 1
+    """
+    dist = np.full(n, UNREACHED, dtype=np.int32)
+    queue = np.empty(n, dtype=np.int32)
+    head, tail = 0, 1
+    queue[0] = src
+    dist[src] = 0
+
+    while head < tail:
+        u = queue[head]
+        head += 1
+        for j in range(indptr[u], indptr[u + 1]):
+            v = indices[j]
+            if dist[v] == UNREACHED:
+                dist[v] = dist[u] + 1
+                queue[tail] = v
+                tail += 1
+
+    return dist
+
+
+@njit(cache=True)
+def _expand_level(indptr: np.ndarray, indices: np.ndarray, queue: np.ndarray, head: int, tail: int,
+                  dist: np.ndarray, parent: np.ndarray, other_dist: np.ndarray) -> tuple[int, int]:
+    """Expand the BFS level queue[head:tail] of one side of a bidirectional search, appending the newly reached
+    vertices to queue.
+
+    Return the new end of queue, and the newly reached vertex already reached by the other side (i.e. with
+    other_dist set) that is closest to the other side's source, or -1 if there is no such vertex.
+    """
+    meet = -1
+    end = tail
+    for k in range(head, end):
+        u = queue[k]
+        for j in range(indptr[u], indptr[u + 1]):
+            v = indices[j]
+            if dist[v] == UNREACHED:
+                dist[v] = dist[u] + 1
+                parent[v] = u
+                queue[tail] = v
+                tail += 1
+                if other_dist[v] != UNREACHED and (meet == -1 or other_dist[v] < other_dist[meet]):
+                    meet = v
+
+    return tail, meet
+
+
+@njit(cache=True)
+def bfs_path(indptr: np.ndarray, indices: np.ndarray, src: int, tgt: int, n: int) -> np.ndarray:
+    """Return an int32 array of the vertex ids on a shortest path from src to tgt, both included.
+
+    Return an empty array if tgt cannot be reached from src.
+
+    The search runs from both ends at once, always expanding a whole level of the smaller frontier, and stops at
+    the first level where the two searches meet.
+
+    Preconditions:
+        - 0 <= src < n and 0 <= tgt < n
+        - indptr.size == n + 1
+        - the graph is undirected
+    """
+    if src == tgt:
+        return np.full(1, src, dtype=np.int32)
+
+    dist_f = np.full(n, UNREACHED, dtype=np.int32)
+    dist_b = np.full(n, UNREACHED, dtype=np.int32)
+    parent_f = np.full(n, -1, dtype=np.int32)
+    parent_b = np.full(n, -1, dtype=np.int32)
+    queue_f = np.empty(n, dtype=np.int32)
+    queue_b = np.empty(n, dtype=np.int32)
+    dist_f[src] = 0
+    dist_b[tgt] = 0
+    queue_f[0] = src
+    queue_b[0] = tgt
+    head_f, tail_f, head_b, tail_b = 0, 1, 0, 1
+    meet = -1
+
+    while meet == -1 and head_f < tail_f and head_b < tail_b:
+        if tail_f - head_f <= tail_b - head_b:
+            new_tail, meet = _expand_level(indptr, indices, queue_f, head_f, tail_f, dist_f, parent_f, dist_b)
+            head_f, tail_f = tail_f, new_tail
+        else:
+            new_tail, meet = _expand_level(indptr, indices, queue_b, head_b, tail_b, dist_b, parent_b, dist_f)
+            head_b, tail_b = tail_b, new_tail
+
+    if meet == -1:
+        return np.empty(0, dtype=np.int32)
+
+    # The backward half runs from tgt to meet, so it is reversed and meet is not repeated.
+    forward = _walk_parents(parent_f, src, meet)
+    backward = _walk_parents(parent_b, tgt, meet)
+    return np.concatenate((forward, backward[-2::-1]))
+
+
+@njit(cache=True)
+def bfs_path_via_movies(app_indptr: np.ndarray, app_indices: np.ndarray, cast_indptr: np.ndarray,
+                        cast_indices: np.ndarray, movie_ok: np.ndarray, src: int, tgt: int, n: int) -> np.ndarray:
+    """Return an int32 array of the vertex ids on a shortest path from src to tgt, both included, where every
+    two consecutive vertices appeared together in some movie m with movie_ok[m] true.
+
+    The appearances of the vertices and the casts of the movies are given as CSR arrays. Return an empty
+    array if there is no such path.
+
+    Preconditions:
+        - 0 <= src < n and 0 <= tgt < n
+        - app_indptr.size == n + 1
+        - cast_indptr.size == movie_ok.size + 1
+    """
+    # Visited vertices and expanded movies are kept as bitsets, which stay cache resident on large graphs. A
+    # movie's cast all get visited the first time it is expanded, so each movie only needs expanding once.
+    visited = _new_bitset(n)
+    expanded = _new_bitset(movie_ok.size)
+    parent = np.full(n, -1, dtype=np.int32)
+    queue = np.empty(n, dtype=np.int32)
+    head, tail = 0, 1
+    queue[0] = src
+    _test_and_set(visited, src)
+
+    while head < tail and not _is_set(visited, tgt):
+        u = queue[head]
+        head += 1
+        for a in range(app_indptr[u], app_indptr[u + 1]):
+            m = app_indices[a]
+            if movie_ok[m] and not _test_and_set(expanded, m):
+                for c in range(cast_indptr[m], cast_indptr[m + 1]):
+                    v = cast_indices[c]
+                    if not _test_and_set(visited, v):
+                        parent[v] = u
+                        queue[tail] = v
+                        tail += 1
+
+    if not _is_set(visited, tgt):
+        return np.empty(0, dtype=np.int32)
+    return _walk_parents(parent, src, tgt)
+
+
+@njit(cache=True)
+def _lowest_bit(word: np.uint64) -> int:
+    """Return the index of the lowest set bit of the given non-zero word."""
+    return _DEBRUIJN_BITS[((word & (~word + np.uint64(1))) * _DEBRUIJN) >> np.uint64(58)]
+
+
+@njit(cache=True)
+def _average_distances_batch(indptr: np.ndarray, indices: np.ndarray, mask: np.ndarray, batch: np.ndarray,
+                             out: np.ndarray, seen: np.ndarray, frontier: np.ndarray, reached: np.ndarray) -> None:
+    """Set out[s], for every source s in batch, to the mean length of a shortest path from s to every other
+    vertex v with mask[v] set that can be reached from s, or infinity if there are none.
+
+    The BFS from every source in the batch runs at once: bit b of a vertex's word in seen and frontier records
+    whether batch[b] has reached it, or reached it in the last level, so one pass over an edge advances every
+    source whose frontier crosses it. seen, frontier and reached are uint64 scratch arrays of size n.
+
+    Preconditions:
+        - 0 < batch.size <= BATCH_WIDTH
+    """
+    n = indptr.size - 1
+    total = np.zeros(batch.size, dtype=np.int64)
+    count = np.zeros(batch.size, dtype=np.int64)
+    seen[:] = 0
+    frontier[:] = 0
+    for b in range(batch.size):
+        seen[batch[b]] |= np.uint64(1) << np.uint64(b)
+        frontier[batch[b]] = seen[batch[b]]
+
+    level, active = 0, True
+    while active:
+        level += 1
+        reached[:] = 0
+        for u in range(n):
+            f = frontier[u]
+            if f != 0:
+                for j in range(indptr[u], indptr[u + 1]):
+                    reached[indices[j]] |= f
+
+        active = False
+        for v in range(n):
+            new = reached[v] & ~seen[v]
+            frontier[v] = new
+            if new != 0:
+                active = True
+                seen[v] |= new
+                if mask[v]:
+                    while new != 0:
+                        b = _lowest_bit(new)
+                        total[b] += level
+                        count[b] += 1
+                        new &= new - np.uint64(1)
+
+    for b in range(batch.size):
+        out[batch[b]] = total[b] / count[b] if count[b] > 0 else np.inf
+
+
+@njit(cache=True, parallel=True)
+def all_bacon_avgs(indptr: np.ndarray, indices: np.ndarray, actor_mask: np.ndarray, sources: np.ndarray,
+                   n: int) -> np.ndarray:
+    """Return a float64 array holding, for every vertex s with sources[s] set, the mean length of a shortest
+    path from s to every other reachable vertex with actor_mask set (NaN for the other vertices).
+
+    The sources are searched BATCH_WIDTH at a time with a bit-parallel BFS, and the batches are split into
+    strided chunks that run in parallel, each reusing its own scratch arrays.
+
+    Preconditions:
+        - indptr.size == n + 1
+        - actor_mask.size == n and sources.size == n
+    """
+    out = np.full(n, np.nan)
+    ids = np.nonzero(sources)[0]
+    n_batches = (ids.size + BATCH_WIDTH - 1) // BATCH_WIDTH
+    n_chunks = min(SOURCE_CHUNKS, n_batches)
+
+    for c in prange(n_chunks):
+        seen = np.empty(n, dtype=np.uint64)
+        frontier = np.empty(n, dtype=np.uint64)
+        reached = np.empty(n, dtype=np.uint64)
+        for k in range(c, n_batches, n_chunks):
+            batch = ids[k * BATCH_WIDTH:(k + 1) * BATCH_WIDTH]
+            _average_distances_batch(indptr, indices, actor_mask, batch, out, seen, frontier, reached)
+
+    return out
+
+
+@njit(cache=True, parallel=True)
+def all_distances(indptr: np.ndarray, indices: np.ndarray, out: np.ndarray) -> None:
+    """Fill the (n, n) int16 array out so that out[s, t] is the length of a shortest path from s to t, or
+    UNREACHED if there is none.
+
+    The rows are computed in strided chunks that run in parallel, each reusing its own scratch arrays.
+
+    Preconditions:
+        - out.shape == (indptr.size - 1, indptr.size - 1)
+        - every shortest path has fewer than 2 ** 15 edges
+    """
+    n = out.shape[0]
+    n_chunks = min(SOURCE_CHUNKS, n)
+
+    for c in prange(n_chunks):
+        dist = np.empty(n, dtype=np.int32)
+        queue = np.empty(n, dtype=np.int32)
+        for s in range(c, n, n_chunks):
+            dist[:] = UNREACHED
+            dist[s] = 0
+            queue[0] = s
+            head, tail = 0, 1
+            while head < tail:
+                u = queue[head]
+                head += 1
+                for j in range(indptr[u], indptr[u + 1]):
+                    v = indices[j]
+                    if dist[v] == UNREACHED:
+                        dist[v] = dist[u] + 1
+                        queue[tail] = v
+                        tail += 1
+            out[s, :] = dist.astype(np.int16)
+
+
+@njit(cache=True)
+def _build_quadtree(pos: np.ndarray, mass: np.ndarray, cap: int) -> tuple:
+    """Return the arrays of a Barnes-Hut quadtree over the given positions and masses, and its number of cells,
+    or a number of cells of -1 if it needs more than cap cells.
+
+    Cell 0 is the root square bounding every position. A cell's body is the single vertex it holds,
+    QUAD_EMPTY, QUAD_INTERNAL for a cell split into children, or QUAD_MERGED for a cell too small to split
+    holding several vertices. Each cell's mass and centre of mass cover every vertex inside it.
+
+    >>> pos = np.array([[0.0, 0.0], [1.0, 1.0], [1.0, 0.0]])
+    >>> child, body, cell_mass, com, centre, half, n_cells = _build_quadtree(pos, np.ones(3), 16)
+    >>> n_cells
+    4
+    >>> body[:n_cells].tolist() == [QUAD_INTERNAL, 0, 1, 2]
+    True
+    >>> com[0].round(3).tolist(), float(cell_mass[0])
+    ([0.667, 0.333], 3.0)
+    >>> _build_quadtree(pos, np.ones(3), 2)[-1]
+    -1
+    """
+    child = np.full((cap, 4), -1, dtype=np.int32)
+    body = np.full(cap, QUAD_EMPTY, dtype=np.int32)
+    cell_mass = np.zeros(cap)
+    com = np.zeros((cap, 2))
+    centre = np.empty((cap, 2))
+    half = np.empty(cap)
+
+    centre[0, 0] = (pos[:, 0].max() + pos[:, 0].min()) / 2
+    centre[0, 1] = (pos[:, 1].max() + pos[:, 1].min()) / 2
+    half[0] = max(pos[:, 0].max() - pos[:, 0].min(), pos[:, 1].max() - pos[:, 1].min()) / 2 + 1e-9
+    min_half = half[0] * 1e-9
+    n_cells = 1
+
+    for b in range(pos.shape[0]):
+        node = 0
+        while True:
+            cell_mass[node] += mass[b]
+            com[node, 0] += mass[b] * pos[b, 0]
+            com[node, 1] += mass[b] * pos[b, 1]
+            if body[node] == QUAD_EMPTY:
+                body[node] = b
+                break
+            if body[node] == QUAD_MERGED:
+                break
+            if body[node] >= 0:
+                if half[node] < min_half:
+                    body[node] = QUAD_MERGED
+                    break
+                # Split the cell, moving the vertex it held down into one of its new children
+                if n_cells == cap:
+                    return child, body, cell_mass, com, centre, half, -1
+                old = body[node]
+                q = (pos[old, 0] >= centre[node, 0]) + 2 * (pos[old, 1] >= centre[node, 1])
+                c = n_cells
+                n_cells += 1
+                half[c] = half[node] / 2
+                centre[c, 0] = centre[node, 0] + (half[c] if q & 1 else -half[c])
+                centre[c, 1] = centre[node, 1] + (half[c] if q & 2 else -half[c])
+                body[c] = old
+                cell_mass[c] = mass[old]
+                com[c, 0] = mass[old] * pos[old, 0]
+                com[c, 1] = mass[old] * pos[old, 1]
+                child[node, q] = c
+                body[node] = QUAD_INTERNAL
+
+            q = (pos[b, 0] >= centre[node, 0]) + 2 * (pos[b, 1] >= centre[node, 1])
+            if child[node, q] == -1:
+                if n_cells == cap:
+                    return child, body, cell_mass, com, centre, half, -1
+                c = n_cells
+                n_cells += 1
+                half[c] = half[node] / 2
+                centre[c, 0] = centre[node, 0] + (half[c] if q & 1 else -half[c])
+                centre[c, 1] = centre[node, 1] + (half[c] if q & 2 else -half[c])
+                child[node, q] = c
+            node = child[node, q]
+
+    for c in range(n_cells):
+        com[c, 0] /= cell_mass[c]
+        com[c, 1] /= cell_mass[c]
+
+    return child, body, cell_mass, com, centre, half, n_cells
+
+
+@njit(cache=True, parallel=True)
+def forceatlas2_layout(pos: np.ndarray, indptr: np.ndarray, indices: np.ndarray, iterations: int,
+                       theta: float) -> None:
+    """Move the (n, 2) float64 positions in pos by running the given number of iterations of a ForceAtlas2-style
+    force-directed layout on the graph stored in the given CSR arrays.
+
+    Every vertex has mass one more than its degree. Every pair of vertices repels with force m1 * m2 / (10 * n * d),
+    every edge attracts with force d, and every vertex is pulled towards the origin with force m / n, where d is
+    the distance between the two vertices. Repulsion is approximated with a Barnes-Hut quadtree, treating each
+    cell whose width is less than theta times its distance as a single mass, so that an iteration takes
+    O(n log n) time. Each vertex moves by at most the current temperature, which cools linearly from a tenth of
+    the width of the layout.
+
+    Preconditions:
+        - pos.shape == (indptr.size - 1, 2)
+        - every row of the CSR arrays also appears in the rows of its entries (the graph is undirected)
+        - theta > 0
+
+    >>> start = np.random.default_rng(0).random((5, 2))
+    >>> indptr, indices = pack_rows([[1], [0, 2], [1, 3], [2, 4], [3]])
+    >>> pos, again = start.copy(), start.copy()
+    >>> forceatlas2_layout(pos, indptr, indices, 50, 1.2)
+    >>> forceatlas2_layout(again, indptr, indices, 50, 1.2)
+    >>> bool(np.isfinite(pos).all()) and np.array_equal(pos, again) and not np.array_equal(pos, start)
+    True
+    """
+    n = pos.shape[0]
+    if n == 0:
+        return
+    mass = (np.diff(indptr) + 1).astype(np.float64)
+    kr = 0.1 / n
+    kg = 1 / n
+    t = max(pos[:, 0].max() - pos[:, 0].min(), pos[:, 1].max() - pos[:, 1].min()) * 0.1
+    dt = t / (iterations + 1)
+    disp = np.empty((n, 2))
+    cap = 4 * n + 16
+
+    for _ in range(iterations):
+        n_cells = -1
+        while n_cells == -1:
+            child, body, cell_mass, com, _, half, n_cells = _build_quadtree(pos, mass, cap)
+            if n_cells == -1:
+                cap *= 2
+
+        for i in prange(n):
+            x, y = pos[i, 0], pos[i, 1]
+            dx_sum, dy_sum = 0.0, 0.0
+
+            # A cell is only split while it is at least 1e-9 times the root's width, so the tree is under 31
+            # levels deep and a depth-first walk never holds more than 3 siblings per level plus 4 children.
+            stack = np.empty(QUAD_STACK_SIZE, dtype=np.int32)
+            stack[0] = 0
+            top = 1
+            while top > 0:
+                top -= 1
+                node = stack[top]
+                if body[node] == i or cell_mass[node] == 0:
+                    continue
+                dx, dy = x - com[node, 0], y - com[node, 1]
+                d2 = max(dx * dx + dy * dy, 1e-8)
+                if body[node] != QUAD_INTERNAL or 4 * half[node] * half[node] < theta * theta * d2:
+                    f = kr * mass[i] * cell_mass[node] / d2
+                    dx_sum += dx * f
+                    dy_sum += dy * f
+                else:
+                    for q in range(4):
+                        if child[node, q] != -1:
+                            stack[top] = child[node, q]
+                            top += 1
+
+            for p in range(indptr[i], indptr[i + 1]):
+                j = indices[p]
+                dx_sum -= x - pos[j, 0]
+                dy_sum -= y - pos[j, 1]
+
+            d = max(np.sqrt(x * x + y * y), 1e-8)
+            dx_sum -= kg * mass[i] * x / d
+            dy_sum -= kg * mass[i] * y / d
+            disp[i, 0] = dx_sum
+            disp[i, 1] = dy_sum
+
+        for i in prange(n):
+            length = np.sqrt(disp[i, 0] ** 2 + disp[i, 1] ** 2)
+            if length > t:
+                pos[i, 0] += disp[i, 0] * t / length
+                pos[i, 1] += disp[i, 1] * t / length
+            else:
+                pos[i, 0] += disp[i, 0]
+                pos[i, 1] += disp[i, 1]
+        t -= dt
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['numpy', 'numba'],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 120
+    })
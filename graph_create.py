@@ -7,7 +7,17 @@ This file is Copyright (c) 2025 Skye Mah-Madjar, Krisztian Drimba, Joshua Iaboni
 
 from __future__ import annotations
 import csv
-from graph_entities import Graph
+from functools import lru_cache
+import os
+import pickle
+from sys import intern
+from typing import Any, Iterable
+import numpy as np
+from graph_entities import Graph, SAVE_FORMAT_VERSION
+
+
+# The columns of a dataset, in order: (actor, movie, year, votes, rating).
+DATASET_COLUMNS = ['Actor', 'Film', 'Year', 'Votes', 'Rating']
 
 
 def initialize_graphs(dataset: str) -> tuple[Graph(), dict]:
@@ -21,20 +31,80 @@ def initialize_graphs(dataset: str) -> tuple[Graph(), dict]:
     return actor_graph, movies
 
 
+def initialize_graphs_cached(dataset: str, cache_file: str) -> tuple[Graph, dict]:
+    """Return the actor graph and movies dictionary of initialize_graphs(dataset), loading them from the pickle file
+    cache_file if it was written after dataset was last modified, and otherwise building them and writing them there.
+
+    The file is tagged with SAVE_FORMAT_VERSION, and one written with a different version (or that cannot be
+    unpickled at all) is rebuilt. The actor graph is frozen before it is written, so its CSR arrays are loaded
+    along with it.
+    """
+    if os.path.exists(cache_file) and os.path.getmtime(cache_file) >= os.path.getmtime(dataset):
+        try:
+            with open(cache_file, 'rb') as file:
+                cached = pickle.load(file)
+        except (pickle.UnpicklingError, AttributeError, EOFError, ImportError, TypeError):
+            cached = None
+        if isinstance(cached, tuple) and len(cached) == 3 and cached[0] == SAVE_FORMAT_VERSION:
+            return cached[1], cached[2]
+
+    actor_graph, movies = initialize_graphs(dataset)
+    actor_graph.freeze()
+    with open(cache_file, 'wb') as file:
+        pickle.dump((SAVE_FORMAT_VERSION, actor_graph, movies), file, protocol=pickle.HIGHEST_PROTOCOL)
+    return actor_graph, movies
+
+
+@lru_cache(maxsize=1)
+def _arrow() -> Any:
+    """Return the pyarrow module, imported along with its csv module, or None if pyarrow is not installed.
+
+    pyarrow is optional: the readers below fall back to the csv module without it.
+    """
+    try:
+        import pyarrow
+        import pyarrow.csv
+    except ImportError:
+        return None
+    return pyarrow
+
+
 def load_csv_file(dataset: str) -> dict:
     """Loads data from a given csv file, creating a dictionary mapping each movie name to a tuple consisting of
     (1) a set of all actors in that movie and (2) a tuple containing the movie's
-    release year, number of votes, and rating"""
+    release year, number of votes, and rating
+
+    The file is parsed with pyarrow if it is installed, and with the csv module otherwise. Either way every value is
+    kept as a string.
+    """
+    arrow = _arrow()
+    if arrow is not None:
+        table = arrow.csv.read_csv(dataset, convert_options=arrow.csv.ConvertOptions(
+            include_columns=DATASET_COLUMNS, column_types={column: arrow.string() for column in DATASET_COLUMNS}))
+        rows = zip(*(table.column(column).to_pylist() for column in DATASET_COLUMNS))
+        return _movies_from_rows(rows)
 
-    movies = {}
     with open(dataset, 'r') as file:
         reader = csv.reader(file)
         next(reader)
-        for row in reader:
-            if row[1] not in movies:
-                movies[row[1]] = ({row[0]}, (row[2], row[3], row[4]))  # Tuple containing ({cast}, year, votes, rating)
-            else:
-                movies[row[1]][0].add(row[0])
+        return _movies_from_rows(reader)
+
+
+def _movies_from_rows(rows: Iterable) -> dict:
+    """A helper function for load_csv_file
+    Builds the movies dictionary from rows of (actor, movie, year, votes, rating).
+
+    Actor and movie names are interned, so every occurrence of the same name shares one string object.
+    """
+    movies = {}
+    get_movie = movies.get
+    for actor, name, year, votes, rating in rows:
+        actor = intern(actor)
+        movie = get_movie(name)
+        if movie is None:
+            movies[intern(name)] = ({actor}, (year, votes, rating))  # Tuple containing ({cast}, year, votes, rating)
+        else:
+            movie[0].add(actor)
     return movies
 
 
@@ -53,24 +123,15 @@ def create_actor_graph(movies: dict) -> Graph:
     """
     graph = Graph()
 
-    for movie in movies:
-        for actor in movies[movie][0]:
+    for movie, (cast, _) in movies.items():
+        for actor in cast:
             graph.add_vertex(actor, 'actor')
             graph.add_appearances(actor, movie)
-            _create_actor_graph_helper(movies, movie, graph, actor)
 
+    graph.add_edges_bulk(movie_cast for movie_cast, _ in movies.values())
     return graph
 
 
-def _create_actor_graph_helper(movies: dict, movie: str, graph: Graph(), actor: str) -> None:
-    """A helper function for create_actor_graph
-    Adds edges between actor and actors in movies if the actors appear in the graph.
-    """
-    for actor2 in movies[movie][0]:
-        if graph.item_in_graph(actor2) and actor != actor2:
-            graph.add_edge(actor, actor2)
-
-
 def create_recommended_movie_graph(main_movie: str, recommendations: list | dict, sim_scores: dict) -> Graph():
     """Creates a graph based on the movie recommendation list or reccomendation dictionary
     Each vertex in the graph is a movie, and each edge in the graph is the actors that appear in both movies
@@ -103,23 +164,28 @@ def create_recommended_movie_graph(main_movie: str, recommendations: list | dict
 
 
 def create_dict_from_csv(dataset: str) -> dict[str, float]:
-    """Creates a dictionary from a CSV file."""
-    actor_dict = {}
-
-    with open(dataset, mode='r') as file:
-        reader = csv.reader(file)
+    """Creates a dictionary from a CSV file of (actor, average bacon number) rows, sorted from the lowest average to
+    the highest. Actors with an infinite average (i.e. connected to no other actor) are kept, after all the others.
 
-        next(reader)
-
-        for row in reader:
-            actor = row[0]
-            rating = float(row[1])
-            if rating != 'Infinity':
-                actor_dict[actor] = rating
+    The file is parsed with pyarrow if it is installed, and with the csv module otherwise.
+    """
+    arrow = _arrow()
+    if arrow is not None:
+        table = arrow.csv.read_csv(dataset)
+        actors = table.column(0).to_pylist()
+        ratings = table.column(1).to_numpy().astype(float)
+    else:
+        with open(dataset, mode='r') as file:
+            reader = csv.reader(file)
+            next(reader)
+            rows = list(reader)
+        actors = [row[0] for row in rows]
+        ratings = np.array([float(row[1]) for row in rows])
 
-    sorted_actor_dict = dict(sorted(actor_dict.items(), key=lambda item: item[1]))
+    # A stable sort keeps actors with equal averages in file order
+    order = np.argsort(ratings, kind='stable')
 
-    return sorted_actor_dict
+    return {actors[i]: float(ratings[i]) for i in order.tolist()}
 
 
 if __name__ == '__main__':
@@ -128,7 +194,10 @@ if __name__ == '__main__':
 
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['graph_entities', 'csv'],
-        'allowed-io': ['load_csv_file', 'create_dict_from_csv'],
-        'max-line-length': 120
+        'extra-imports': ['graph_entities', 'csv', 'functools', 'os', 'pickle', 'sys', 'typing', 'numpy', 'pyarrow',
+                          'pyarrow.csv'],
+        'allowed-io': ['initialize_graphs_cached', 'load_csv_file', 'create_dict_from_csv'],
+        'max-line-length': 120,
+        # pyarrow is optional, so it is imported inside _arrow rather than at the top of this file
+        'disable': ['import-outside-toplevel']
     })
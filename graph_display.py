@@ -5,10 +5,18 @@ This file contains functions for displaying our generated graphs.
 This file is Copyright (c) 2025 Skye Mah-Madjar, Krisztian Drimba, Joshua Iaboni, and Xiayu Lyu.
 """
 
-import networkx as nx
-from plotly.graph_objs import Scatter, Figure
+from __future__ import annotations
+from functools import lru_cache
+from typing import TYPE_CHECKING
+import numpy as np
 from graph_entities import Graph
 
+# networkx and plotly take a noticeable time to import, so they are only imported by the functions that use them,
+# the first time something is displayed.
+if TYPE_CHECKING:
+    import networkx as nx
+    from plotly.graph_objs import Scattergl, Figure
+
 COLOUR_SCHEME = [
     '#2E91E5', '#E15F99', '#1CA71C', '#FB0D0D', '#DA16FF', '#222A2A', '#B68100',
     '#750D86', '#EB663B', '#511CFB', '#00A08B', '#FB00D1', '#FC0080', '#B2828D',
@@ -16,29 +24,99 @@ COLOUR_SCHEME = [
     '#6C4516', '#0D2A63', '#AF0038'
 ]
 
-LINE_COLOUR = 'rgb(210,210,210)'
-VERTEX_BORDER_COLOUR = 'rgb(50,50,50)'
-ACTOR_COLOUR = 'rgb(105, 89, 205)'
-MOVIE_COLOUR = 'rgb(89, 205, 105)'
+LINE_COLOUR = '#D2D2D2'
+VERTEX_BORDER_COLOUR = '#323232'
+ACTOR_COLOUR = '#6959CD'
+MOVIE_COLOUR = '#59CD69'
+
+# Seed for the randomised networkx layouts, so the same graph is always drawn the same way
+LAYOUT_SEED = 42
+SEEDED_LAYOUTS = {'spring_layout', 'fruchterman_reingold_layout', 'random_layout'}
+
+# Graphs with more vertices than this are laid out with the compiled ForceAtlas2-style layout from calculations_fast
+# instead of networkx's spring layout, whose repulsion takes O(n^2) time per iteration
+COMPILED_LAYOUT_MIN_VERTICES = 500
 
 
 #######################################################################################################################
 # General Helper Functions
 #######################################################################################################################
 
-def compute_layout_and_scaling(g: nx.Graph, layout: str) -> tuple[dict[any, tuple], float, tuple[float, float]]:
+@lru_cache(maxsize=32)
+def _layout_positions(nodes: tuple, edges: frozenset, layout: str, seed: int | None) -> dict[any, tuple]:
     """
-    Computes node positions using the given layout and calculates scaling factors and buffer margins.
+    Computes node positions for the graph with the given nodes and edges using the given networkx layout, or the
+    compiled ForceAtlas2-style layout if layout is 'forceatlas2'. Spring layouts of graphs with more than
+    COMPILED_LAYOUT_MIN_VERTICES vertices also use the compiled layout.
+
+    Layouts in SEEDED_LAYOUTS are run with the given seed, and the spring layout stops once its positions move by
+    less than 1e-3 in an iteration. The results are cached, so showing the same graph again skips the layout solve.
+    The returned dictionary is shared between calls and must not be mutated.
     """
-    # Compute positions using the chosen layout algorithm
-    pos = getattr(nx, layout)(g)
+    import networkx as nx
+    if layout == 'forceatlas2' or (layout in {'spring_layout', 'fruchterman_reingold_layout'}
+                                   and len(nodes) > COMPILED_LAYOUT_MIN_VERTICES):
+        return _compiled_layout(nodes, edges, seed)
 
-    x_values = [pos[node][0] for node in g.nodes()]
-    y_values = [pos[node][1] for node in g.nodes()]
+    g = nx.Graph()
+    g.add_nodes_from(nodes)
+    g.add_edges_from(edges)
+    if layout == 'spring_layout':
+        return nx.spring_layout(g, seed=seed, iterations=50, threshold=1e-3)
+    elif layout in SEEDED_LAYOUTS:
+        return getattr(nx, layout)(g, seed=seed)
+    else:
+        return getattr(nx, layout)(g)
+
+
+def _compiled_layout(nodes: tuple, edges: frozenset, seed: int | None, iterations: int = 50) -> dict[any, np.ndarray]:
+    """
+    Computes node positions for the graph with the given nodes and edges using the ForceAtlas2-style layout
+    compiled by Numba, whose repulsion is approximated with a Barnes-Hut quadtree so it scales to large graphs.
+
+    The positions start uniformly at random in the unit square, drawn with the given seed, and are rescaled to
+    [-1, 1] at the end.
+
+    >>> pos = _compiled_layout(('a', 'b', 'c'), frozenset({('a', 'b'), ('b', 'c')}), 0)
+    >>> all(np.isfinite(pos[node]).all() for node in 'abc')
+    True
+    >>> all((pos[node] == p).all() for node, p in _compiled_layout(('a', 'b', 'c'), \
+    frozenset({('a', 'b'), ('b', 'c')}), 0).items())
+    True
+    """
+    from networkx import rescale_layout
+    from calculations_fast import forceatlas2_layout, pack_rows
+    node_index = {node: i for i, node in enumerate(nodes)}
+    rows = [[] for _ in nodes]
+    for u, v in edges:
+        if u != v:
+            rows[node_index[u]].append(node_index[v])
+            rows[node_index[v]].append(node_index[u])
+    indptr, indices = pack_rows(rows)
+
+    pos = np.random.default_rng(seed).random((len(nodes), 2))
+    forceatlas2_layout(pos, indptr, indices, iterations, 1.2)
+    pos = rescale_layout(pos)
+    return dict(zip(nodes, pos))
+
+
+def compute_layout_and_scaling(g: nx.Graph, layout: str, seed: int | None = LAYOUT_SEED) \
+        -> tuple[dict[any, tuple], float, tuple[float, float, float, float], tuple[float, float]]:
+    """
+    Computes node positions using the given layout and calculates the scaling factor, the bounds
+    (min_x, max_x, min_y, max_y) of the positions, and buffer margins.
+
+    layout is the name of a networkx layout function, or 'forceatlas2'. Randomised layouts use the given seed;
+    pass None to let networkx choose a random one.
+    """
+    # Compute positions using the chosen layout algorithm, reusing them if this graph was laid out before
+    pos = _layout_positions(tuple(g.nodes()), frozenset(g.edges()), layout, seed)
+
+    points = np.array([pos[node] for node in g.nodes()], dtype=float).reshape(-1, 2)
 
     # Compute canvas buffers
-    min_x, max_x = min(x_values), max(x_values)
-    min_y, max_y = min(y_values), max(y_values)
+    min_x, min_y = points.min(axis=0).tolist()
+    max_x, max_y = points.max(axis=0).tolist()
     buffer_x = (max_x - min_x) * 0.30
     buffer_y = (max_y - min_y) * 0.30
 
@@ -46,12 +124,15 @@ def compute_layout_and_scaling(g: nx.Graph, layout: str) -> tuple[dict[any, tupl
     avg_range = ((max_x - min_x) + (max_y - min_y)) / 2.0
     scale = avg_range / 3 if avg_range != 0 else 1
 
-    return pos, scale, (buffer_x, buffer_y)
+    return pos, scale, (min_x, max_x, min_y, max_y), (buffer_x, buffer_y)
 
 
+@lru_cache(maxsize=64)
 def compute_scaled_parameters(scale: float) -> dict[str, float]:
     """
     Computes scaled parameters for node sizes, fonts, and edge widths.
+
+    The results are cached, so the returned dictionary is shared between calls and must not be mutated.
     """
     base_node_size = 50
     base_node_font = 50
@@ -66,49 +147,100 @@ def compute_scaled_parameters(scale: float) -> dict[str, float]:
     }
 
 
-def create_edge_trace(g: nx.Graph, pos: dict[any, tuple], scaled: dict[str, float]) -> Scatter:
+def create_edge_trace(g: nx.Graph, pos: dict[any, tuple], scaled: dict[str, float], label_attr: str,
+                      font_size: float, render_cap: int | None = None) -> Scattergl:
     """
-    Creates the Plotly scatter trace for edges.
-    """
-    x_edges, y_edges = [], []
-    for edge in g.edges():
-        x_edges += [pos[edge[0]][0], pos[edge[1]][0], None]
-        y_edges += [pos[edge[0]][1], pos[edge[1]][1], None]
+    Creates the Plotly scatter trace for edges and their labels.
+
+    Each edge contributes its two endpoints with its midpoint between them, followed by a NaN, which Plotly treats
+    as a break in the line. The edge's label_attr is drawn as text at the midpoint, so edges and their labels share
+    a single trace.
 
-    return Scatter(
+    If render_cap is given and g has more edges than it, only render_cap edges (and their labels) are drawn so the
+    figure stays responsive. Labelled edges are kept first, as a fixed random sample of them if there are more than
+    render_cap, and any room left is filled with a fixed random sample of the unlabelled ones.
+    """
+    from plotly.graph_objs import Scattergl
+    nodes = list(g.nodes())
+    node_index = {node: i for i, node in enumerate(nodes)}
+    points = np.array([pos[node] for node in nodes], dtype=float).reshape(-1, 2)
+    edges = list(g.edges(data=label_attr, default=''))
+    if render_cap is not None and len(edges) > render_cap:
+        labelled = [edge for edge in edges if edge[2] != '']
+        unlabelled = [edge for edge in edges if edge[2] == '']
+        rng = np.random.default_rng(0)
+        if len(labelled) >= render_cap:
+            edges = [labelled[i] for i in np.sort(rng.choice(len(labelled), render_cap, replace=False))]
+        else:
+            sample = rng.choice(len(unlabelled), render_cap - len(labelled), replace=False)
+            edges = labelled + [unlabelled[i] for i in np.sort(sample)]
+    ends = np.array([(node_index[u], node_index[v]) for u, v, _ in edges], dtype=np.int64).reshape(-1, 2)
+    start, end = points[ends[:, 0]], points[ends[:, 1]]
+
+    # Rows of (start, midpoint, end, NaN) for each edge, flattened into one run of points
+    coordinates = np.stack([start, (start + end) / 2, end, np.full_like(start, np.nan)], axis=1).reshape(-1, 2)
+    x_edges, y_edges = coordinates[:, 0], coordinates[:, 1]
+    text = [''] * len(x_edges)
+    text[1::4] = [str(label) for _, _, label in edges]
+
+    return Scattergl(
         x=x_edges,
         y=y_edges,
-        mode='lines',
+        mode='lines+text',
         name='edges',
+        text=text,
+        textposition='middle center',
+        textfont={"size": font_size},
         line={"color": LINE_COLOUR, "width": scaled['edge_width']},
         hoverinfo='none'
     )
 
 
-def build_figure(edge_trace: Scatter, node_trace: Scatter, edge_label_trace: Scatter,
-                 pos: dict[any, tuple], buffers: tuple[float, float]) -> Figure:
+def build_figure(edge_trace: Scattergl, node_trace: Scattergl, bounds: tuple[float, float, float, float],
+                 buffers: tuple[float, float]) -> Figure:
     """
     Constructs the Plotly figure with the provided traces and layout settings.
 
-    The figure's axes ranges are adjusted using computed buffer margins.
+    The figure's axes ranges are the bounds (min_x, max_x, min_y, max_y) of the positions, widened by the
+    computed buffer margins.
     """
-    x_values = [pos[node][0] for node in pos]
-    y_values = [pos[node][1] for node in pos]
-    min_x, max_x = min(x_values), max(x_values)
-    min_y, max_y = min(y_values), max(y_values)
+    from plotly.graph_objs import Figure
+    min_x, max_x, min_y, max_y = bounds
     buffer_x, buffer_y = buffers
 
-    fig = Figure(data=[edge_trace, node_trace, edge_label_trace])
-    fig.update_layout(
-        showlegend=False,
-        xaxis={"showgrid": False, "zeroline": False, "visible": False,
-               "range": [min_x - buffer_x, max_x + buffer_x]},
-        yaxis={"showgrid": False, "zeroline": False, "visible": False,
-               "range": [min_y - buffer_y, max_y + buffer_y]}
-    )
+    fig = Figure(data=[edge_trace, node_trace])
+    with fig.batch_update():
+        fig.update_layout(
+            showlegend=False,
+            xaxis={"showgrid": False, "zeroline": False, "visible": False,
+                   "range": [min_x - buffer_x, max_x + buffer_x]},
+            yaxis={"showgrid": False, "zeroline": False, "visible": False,
+                   "range": [min_y - buffer_y, max_y + buffer_y]}
+        )
     return fig
 
 
+@lru_cache(maxsize=None)
+def _start_image_server() -> None:
+    """
+    Starts kaleido's image export server, if the installed kaleido has one, so that every image written afterwards
+    reuses the same browser process instead of launching its own.
+    """
+    try:
+        import kaleido
+        kaleido.start_sync_server(silence_warnings=True)
+    except (ImportError, AttributeError):
+        pass
+
+
+def save_figure(fig: Figure, output_file: str) -> None:
+    """
+    Writes the figure to output_file as an image, in the format given by the file's extension.
+    """
+    _start_image_server()
+    fig.write_image(output_file)
+
+
 #######################################################################################################################
 # Actor Path Visualization
 #######################################################################################################################
@@ -135,30 +267,33 @@ def build_actor_graph(graph: Graph, path: list[str], used_fallback: bool) -> nx.
     Each actor is added as a node, and if a valid path is provided (i.e., fallback not used),
     edges are added based on common movies.
     """
+    import networkx as nx
     g = nx.Graph()
     # Add nodes
     for actor in path:
         g.add_node(actor, kind='actor')
     # Add edges only if a real path is found
-    if len(path) > 1 and graph.get_common_movies(path[0], path[1]) and not used_fallback:
+    first_common = graph.get_common_movies(path[0], path[1]) if not used_fallback and len(path) > 1 else set()
+    if first_common:
         for i in range(len(path) - 1):
             actor1 = path[i]
             actor2 = path[i + 1]
-            common_movies = graph.get_common_movies(actor1, actor2)
+            common_movies = first_common if i == 0 else graph.get_common_movies(actor1, actor2)
             movies_str = '<br>'.join(sorted(common_movies)) if common_movies else ''
             g.add_edge(actor1, actor2, movies=movies_str)
     return g
 
 
-def create_node_trace_actor_path(g: nx.Graph, pos: dict[any, tuple], scaled: dict[str, float]) -> Scatter:
+def create_node_trace_actor_path(g: nx.Graph, pos: dict[any, tuple], scaled: dict[str, float]) -> Scattergl:
     """
     Creates the Plotly scatter trace for nodes for the actor path visualization.
     """
+    from plotly.graph_objs import Scattergl
     labels = list(g.nodes())
-    x_values = [pos[node][0] for node in g.nodes()]
-    y_values = [pos[node][1] for node in g.nodes()]
+    points = np.array([pos[node] for node in labels], dtype=float).reshape(-1, 2)
+    x_values, y_values = points[:, 0], points[:, 1]
 
-    return Scatter(
+    return Scattergl(
         x=x_values,
         y=y_values,
         mode='markers+text',
@@ -176,43 +311,18 @@ def create_node_trace_actor_path(g: nx.Graph, pos: dict[any, tuple], scaled: dic
     )
 
 
-def create_edge_label_actor_path(g: nx.Graph, pos: dict[any, tuple], scaled: dict[str, float])\
-        -> Scatter:
-    """
-    Creates the Plotly scatter trace for edge labels for the actor path visualization.
-    """
-    edge_label_x, edge_label_y, edge_labels = [], [], []
-    for edge in g.edges(data=True):
-        x0, y0 = pos[edge[0]]
-        x1, y1 = pos[edge[1]]
-        edge_label_x.append((x0 + x1) / 2)
-        edge_label_y.append((y0 + y1) / 2)
-        edge_labels.append(edge[2].get('movies', ''))
-
-    return Scatter(
-        x=edge_label_x,
-        y=edge_label_y,
-        mode='text',
-        text=edge_labels,
-        textposition='middle center',
-        textfont={"size": scaled['edge_font_size']},
-        hoverinfo='none'
-    )
-
-
 def create_traces_actor_path(g: nx.Graph, pos: dict[any, tuple], scale: float)\
-        -> tuple[Scatter, Scatter, Scatter]:
+        -> tuple[Scattergl, Scattergl]:
     """
-    Creates the Plotly scatter traces for edges, nodes, and edge labels for the actor path visualization.
+    Creates the Plotly scatter traces for the labelled edges and the nodes for the actor path visualization.
 
     Scaling is applied to node sizes, fonts, and edge widths.
     """
     scaled = compute_scaled_parameters(scale)
-    edge_trace = create_edge_trace(g, pos, scaled)
+    edge_trace = create_edge_trace(g, pos, scaled, 'movies', scaled['edge_font_size'])
     node_trace = create_node_trace_actor_path(g, pos, scaled)
-    edge_label_trace = create_edge_label_actor_path(g, pos, scaled)
 
-    return edge_trace, node_trace, edge_label_trace
+    return edge_trace, node_trace
 
 
 def visualize_actor_path(graph: Graph, path: list[str], fallback_actors: tuple[str, str] = None,
@@ -231,17 +341,17 @@ def visualize_actor_path(graph: Graph, path: list[str], fallback_actors: tuple[s
     g = build_actor_graph(graph, path, used_fallback)
 
     # Compute layout positions and scaling factors.
-    pos, scale, buffers = compute_layout_and_scaling(g, layout)
+    pos, scale, bounds, buffers = compute_layout_and_scaling(g, layout)
 
-    # Create Plotly traces for edges, nodes, and edge labels.
-    edge_trace, node_trace, edge_label_trace = create_traces_actor_path(g, pos, scale)
+    # Create Plotly traces for the labelled edges and the nodes.
+    edge_trace, node_trace = create_traces_actor_path(g, pos, scale)
 
     # Build the figure with the computed traces and layout.
-    fig = build_figure(edge_trace, node_trace, edge_label_trace, pos, buffers)
+    fig = build_figure(edge_trace, node_trace, bounds, buffers)
 
     # Display or save the figure.
     if output_file:
-        fig.write_image(output_file)
+        save_figure(fig, output_file)
     else:
         fig.show()
 
@@ -250,75 +360,74 @@ def visualize_actor_path(graph: Graph, path: list[str], fallback_actors: tuple[s
 # Recommended Movie Graph Visualization
 #######################################################################################################################
 
-def add_movie_node(graph_nx: nx.Graph, vertex: any, max_vertices: int) -> None:
-    """Add a movie node to graph_nx if it's not already present, and we haven't exceeded max_vertices.
+def add_movie_node(nodes: dict[any, dict], vertex: any, max_vertices: int) -> None:
+    """Add a movie vertex to the node attributes in nodes if it's not already present, and we haven't exceeded
+    max_vertices.
     """
-    if graph_nx.number_of_nodes() < max_vertices and vertex.item not in graph_nx.nodes:
-        graph_nx.add_node(vertex.item,
-                          kind=vertex.kind,
-                          label=f"{vertex.item}",
-                          sim=getattr(vertex, 'sim_score', 0))
-
-
-def get_edge_sim_label(v: any, u: any) -> str:
-    """
-    Determine the edge similarity label between two vertices.
-    If one vertex is the main movie (sim_score == 1) and the other is not,
-    returns the recommended movie's sim_score as a percentage string (e.g., "22.2%");
-    otherwise, returns an empty string.
-    """
-    v_sim = getattr(v, 'sim_score', None)
-    u_sim = getattr(u, 'sim_score', None)
-    if v_sim is not None and u_sim is not None:
-        if v_sim == 1 and u_sim != 1:
-            return f"{u_sim * 100:.1f}%"
-        elif u_sim == 1 and v_sim != 1:
-            return f"{v_sim * 100:.1f}%"
-    return ""
+    if len(nodes) < max_vertices and vertex.item not in nodes:
+        nodes[vertex.item] = {'kind': vertex.kind, 'label': f"{vertex.item}", 'sim': vertex.sim_score}
 
 
 def movie_graph_to_networkx(movie_graph: Graph, max_vertices: int = 5000) -> nx.Graph:
     """
     Convert a custom movie graph (an instance of Graph) into a NetworkX graph.
     Only includes up to max_vertices nodes.
+
+    Each edge between the main movie (sim_score == 1) and another movie is labelled with the other movie's
+    sim_score as a percentage string (e.g., "22.2%"); other edges get an empty label.
+
+    The nodes and edges are collected first and added to the NetworkX graph in one batch each.
     """
-    graph_nx = nx.Graph()
+    import networkx as nx
+    nodes = {}
+    edges = []
     for v in movie_graph.get_vertices().values():
-        if graph_nx.number_of_nodes() >= max_vertices:
+        if len(nodes) >= max_vertices:
             break
         # Add the main movie node.
-        graph_nx.add_node(v.item, kind=v.kind, label=f"{v.item}", sim=getattr(v, 'sim_score', 0))
+        v_sim = v.sim_score
+        nodes[v.item] = {'kind': v.kind, 'label': f"{v.item}", 'sim': v_sim}
 
         for u in v.neighbours:
-            add_movie_node(graph_nx, u, max_vertices)
-            # Compute edge similarity label.
-            edge_label = get_edge_sim_label(v, u)
-            if u.item in graph_nx.nodes:
-                graph_nx.add_edge(v.item, u.item, sim=edge_label)
+            add_movie_node(nodes, u, max_vertices)
+            if u.item in nodes:
+                u_sim = u.sim_score
+                if v_sim == 1 and u_sim != 1:
+                    edge_label = f"{u_sim * 100:.1f}%"
+                elif u_sim == 1 and v_sim != 1:
+                    edge_label = f"{v_sim * 100:.1f}%"
+                else:
+                    edge_label = ""
+                edges.append((v.item, u.item, {'sim': edge_label}))
 
+    graph_nx = nx.Graph()
+    graph_nx.add_nodes_from(nodes.items())
+    graph_nx.add_edges_from(edges)
     return graph_nx
 
 
 def create_node_trace_movie_graph(graph_nx: nx.Graph, pos: dict[any, tuple], base_main_size: float = 30)\
-        -> Scatter:
+        -> Scattergl:
     """
     Extracts node positions and labels, computes node sizes based on similarity scores,
     and returns a Plotly scatter trace for nodes for the movie graph.
     """
-    # Extract node positions and labels.
-    x_values = [pos[n][0] for n in graph_nx.nodes]
-    y_values = [pos[n][1] for n in graph_nx.nodes]
-    labels = [graph_nx.nodes[n].get('label', n) for n in graph_nx.nodes]
+    from plotly.graph_objs import Scattergl
+    # Extract node positions, labels and similarity scores in a single pass over the nodes.
+    # The main movie has a sim_score of 1.
+    points, labels, sims = [], [], []
+    for node, attrs in graph_nx.nodes(data=True):
+        points.append(pos[node])
+        labels.append(attrs.get('label', node))
+        sims.append(attrs.get('sim', 1))
+    points = np.array(points, dtype=float).reshape(-1, 2)
+    x_values, y_values = points[:, 0], points[:, 1]
 
     # Compute node sizes based on the similarity scores.
-    # The main movie has a sim_score of 1.
-    node_sizes = []
-    for node in graph_nx.nodes:
-        sim_val = graph_nx.nodes[node].get('sim', 1)
-        node_sizes.append(base_main_size * (0.5 + sim_val))
+    node_sizes = base_main_size * (0.5 + np.array(sims, dtype=float))
 
     # Create and return the scatter trace for nodes.
-    node_trace = Scatter(
+    node_trace = Scattergl(
         x=x_values,
         y=y_values,
         mode='markers+text',
@@ -335,61 +444,35 @@ def create_node_trace_movie_graph(graph_nx: nx.Graph, pos: dict[any, tuple], bas
     return node_trace
 
 
-def create_edge_label_movie_graph(graph_nx: nx.Graph, pos: dict[any, tuple], font_size: int = 15)\
-        -> Scatter:
-    """
-    Creates a Plotly scatter trace for edge labels representing similarity scores for the movie graph.
-    """
-    edge_label_x = []
-    edge_label_y = []
-    edge_labels = []
-    for edge in graph_nx.edges(data=True):
-        x0, y0 = pos[edge[0]]
-        x1, y1 = pos[edge[1]]
-        edge_label_x.append((x0 + x1) / 2)
-        edge_label_y.append((y0 + y1) / 2)
-        edge_labels.append(str(edge[2].get('sim', '')))
-
-    return Scatter(
-        x=edge_label_x,
-        y=edge_label_y,
-        mode='text',
-        text=edge_labels,
-        textposition='middle center',
-        textfont={"size": font_size},
-        hoverinfo='none'
-    )
-
-
 def visualize_movie_graph(movie_graph: Graph, layout: str = 'spring_layout',
-                          max_vertices: int = 5000, output_file: str = '') -> None:
+                          max_vertices: int = 5000, output_file: str = '', render_cap: int = 20000) -> None:
     """
     Visualizes the recommended movie graph using Plotly.
+
+    At most render_cap edges are drawn; see create_edge_trace. The graph only holds the recommended movies and
+    the edges between them, so this only matters for very large recommendation limits.
     """
     # Convert the custom movie graph to a NetworkX graph.
     graph_nx = movie_graph_to_networkx(movie_graph, max_vertices)
 
-    # Compute positions and canvas buffers using the helper function.
-    pos, _, buffers = compute_layout_and_scaling(graph_nx, layout)
+    # Compute positions, their bounds and canvas buffers using the helper function.
+    pos, _, bounds, buffers = compute_layout_and_scaling(graph_nx, layout)
 
     # Compute scaled parameters using a fixed scale of 1.
     scaled = compute_scaled_parameters(1)
 
-    # Create the scatter trace for edges using the helper function.
-    edge_trace = create_edge_trace(graph_nx, pos, scaled)
+    # Create the scatter trace for edges and their similarity labels using the helper function.
+    edge_trace = create_edge_trace(graph_nx, pos, scaled, 'sim', 15, render_cap)
 
     # Create the scatter trace for nodes using the new helper function.
     node_trace = create_node_trace_movie_graph(graph_nx, pos)
 
-    # Create the scatter trace for edge labels using the new helper function.
-    edge_label_trace = create_edge_label_movie_graph(graph_nx, pos)
-
     # Build the Plotly figure using the build_figure helper.
-    fig = build_figure(edge_trace, node_trace, edge_label_trace, pos, buffers)
+    fig = build_figure(edge_trace, node_trace, bounds, buffers)
 
     # Display or save the figure.
     if output_file:
-        fig.write_image(output_file)
+        save_figure(fig, output_file)
     else:
         fig.show()
 
@@ -400,7 +483,8 @@ if __name__ == '__main__':
 
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['networkx', 'plotly.graph_objs', 'graph_entities'],  # the names (strs) of imported modules
+        'extra-imports': ['functools', 'typing', 'networkx', 'numpy', 'plotly.graph_objs', 'kaleido',
+                          'graph_entities', 'calculations_fast'],  # the names (strs) of imported modules
         'allowed-io': ['visualize_actor_path'],  # the names (strs) of functions that call print/open/input
         'max-line-length': 120
     })
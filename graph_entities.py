@@ -5,9 +5,24 @@ Contains Graph and Vertex classes, as well as methods for dealing with Graph and
 This file is Copyright (c) 2025 Skye Mah-Madjar, Krisztian Drimba, Joshua Iaboni, and Xiayu Lyu."""
 
 from __future__ import annotations
-from collections import deque
-from typing import Any
+import os
+from typing import Any, Iterable
 from random import choice
+import numpy as np
+from calculations_fast import all_bacon_avgs, all_distances, bfs_distances, bfs_path, bfs_path_via_movies, \
+    clique_edges, pack_rows, sorted_intersect, transpose
+
+# The position of each key that movies can be filtered by in the info tuple of a movies dictionary, i.e.
+# movies[movie][1] == (year, votes, rating).
+MOVIE_INFO_INDEX = {'release date': 0, 'rating': 2}
+
+# The number of shortest paths a Graph remembers before it starts forgetting the oldest ones.
+PATH_CACHE_SIZE = 1024
+
+# The version of the layout of the files a Graph is saved to, i.e. the distance matrix files and the pickled graphs
+# written by graph_create.initialize_graphs_cached. Bump it whenever the attributes of Graph or the format of those
+# files change, so that files written by an older version are rebuilt instead of being trusted.
+SAVE_FORMAT_VERSION = 2
 
 
 class _Vertex:
@@ -18,11 +33,10 @@ class _Vertex:
     Instance Attributes:
         - item: The data stored in this vertex, representing an actor or movie.
         - kind: The type of this vertex: 'actor' or 'movie'.
-        - neighbours: The vertices that are adjacent to this vertex.
-        - appearances: The set of movies this actor appears in (if kind == 'actor')
+        - neighbours: The vertices that are adjacent to this vertex (empty while the graph is frozen).
+        - appearances: The set of movies this actor appears in (if kind == 'actor'; empty while the graph is frozen)
         - sim_score: How similar the movie is to a certain movie in the graph, determined by the
         similarity score algorithm (if kind == 'movie')
-        - movie_info: A tuple storing a movie's release year, number of votes, and rating
 
     Representation Invariants:
         - self not in self.neighbours
@@ -30,12 +44,12 @@ class _Vertex:
         - self.kind in {'movie', 'actor'}
         - self.sim_score <= 1
     """
+    __slots__: tuple[str, ...] = ('item', 'kind', 'neighbours', 'appearances', 'sim_score')
     item: Any
     kind: str
     neighbours: set[_Vertex]
     appearances: set[str]
     sim_score: float
-    movie_info: tuple[int, int, float]  # (year, votes, rating)
 
     def __init__(self, item: Any, kind: str) -> None:
         """Initialize a new vertex with the given item and kind.
@@ -46,28 +60,214 @@ class _Vertex:
             - kind in {'actor', 'movie'}
             - self.appearences == set() or kind == 'actor'
             - self.sim_score == 0 or kind == 'movie'
-            - self.movie_info == (0,0,0) or kind == 'movie'
         """
         self.item = item
         self.kind = kind
         self.neighbours = set()
         self.appearances = set()
         self.sim_score = 0
-        self.movie_info = (0, 0, 0)
+
+
+class _CSR:
+    """The adjacency and appearances of a frozen graph in Compressed Sparse Row (CSR) form.
+
+    Instance Attributes:
+        - indptr: The row pointers. The neighbours of the vertex with id i are indices[indptr[i]:indptr[i + 1]].
+        - indices: The ids of the neighbours of each vertex, sorted within each row.
+        - app_indptr, app_indices: The appearances of each vertex in the same form: the movie ids of the vertex with
+          id i are app_indices[app_indptr[i]:app_indptr[i + 1]].
+        - cast_indptr, cast_indices: The transpose of the appearances: the ids of the vertices that appeared in the
+          movie with id m are cast_indices[cast_indptr[m]:cast_indptr[m + 1]].
+    """
+    indptr: np.ndarray
+    indices: np.ndarray
+    app_indptr: np.ndarray
+    app_indices: np.ndarray
+    cast_indptr: np.ndarray
+    cast_indices: np.ndarray
+
+    def __init__(self, neighbours: list[list[int]], appearances: list[list[int]], num_movies: int) -> None:
+        """Pack the given neighbour ids and movie ids of each vertex, indexed by vertex id, into CSR arrays.
+
+        Preconditions:
+            - all(0 <= m < num_movies for row in appearances for m in row)
+        """
+        self.indptr, self.indices = pack_rows(neighbours)
+        self.app_indptr, self.app_indices = pack_rows(appearances)
+        self.cast_indptr, self.cast_indices = transpose(self.app_indptr, self.app_indices, num_movies)
+
+
+class _MovieIndex:
+    """The movies that the actors of a graph appeared in, and the values of their keys in MOVIE_INFO_INDEX.
+
+    Instance Attributes:
+        - movie_id: Maps every movie passed to Graph.add_appearances to its integer movie id.
+        - movie_of: Maps integer movie id back to the movie.
+        - source: The movies dictionary that columns was last built from, or None if it is stale. In-place changes
+          to that dictionary are not detected.
+        - columns: Maps each key in MOVIE_INFO_INDEX to the value of that key for each movie, indexed by movie id
+          (NaN if unknown).
+        - masks: Caches the results of Graph._movie_mask until columns is rebuilt.
+    """
+    movie_id: dict[str, int]
+    movie_of: list[str]
+    source: dict | None
+    columns: dict[str, np.ndarray]
+    masks: dict[tuple[str, float, float], np.ndarray]
+
+    def __init__(self) -> None:
+        """Initialize an index with no movies."""
+        self.movie_id = {}
+        self.movie_of = []
+        self.source = None
+        self.columns = {key: np.empty(0) for key in MOVIE_INFO_INDEX}
+        self.masks = {}
+
+
+class _Caches:
+    """The results computed from a graph that are kept until it is next mutated.
+
+    Instance Attributes:
+        - by_kind: A frozenset copy of the set of items of each vertex kind, as returned by Graph.get_all_vertices.
+        - kind_masks: The result of Graph._kind_mask for each kind.
+        - averages: The results of Graph.average_distance and Graph.average_distances, and the averages passed to
+          Graph.remember_averages.
+        - distances: Maps each item passed to Graph.precompute_distances_from to the BFS distances from it, indexed
+          by vertex id.
+        - matrix: The memory-mapped matrix of the distances between every two vertices from
+          Graph.save_distance_matrix or Graph.load_distance_matrix, and the row and column of that matrix for each
+          vertex id (since vertex ids depend on the order the graph was built in), or None.
+        - common_movies: The results of Graph.get_common_movies, keyed by the pair of vertex ids with the smaller
+          id first.
+        - paths: Up to PATH_CACHE_SIZE results of Graph.shortest_path_bfs and Graph.shortest_path_bfs_filtered, as
+          tuples of vertex ids. Filtered paths are also dropped when the movie columns are rebuilt.
+    """
+    by_kind: dict[str, frozenset]
+    kind_masks: dict[str, np.ndarray]
+    averages: dict[Any, float]
+    distances: dict[Any, np.ndarray]
+    matrix: tuple[np.ndarray, np.ndarray] | None
+    common_movies: dict[tuple[int, int], frozenset[str]]
+    paths: dict[tuple, tuple[int, ...]]
+
+    def __init__(self) -> None:
+        """Initialize empty caches."""
+        self.by_kind = {}
+        self.kind_masks = {}
+        self.averages = {}
+        self.distances = {}
+        self.matrix = None
+        self.common_movies = {}
+        self.paths = {}
 
 
 class Graph:
     """A graph used to represent a network of actors/movies.
+
+    While a graph is being built, adjacency is stored in the neighbours set of each _Vertex. Before it is
+    searched, the graph is frozen into Compressed Sparse Row (CSR) form: every vertex gets an integer id, and
+    the ids of its neighbours are stored contiguously in one flat array. Mutating a frozen graph thaws it again.
     """
     # Private Instance Attributes:
     #     - _vertices:
     #         A collection of the vertices contained in this graph.
     #         Maps item to _Vertex object.
+    #     - _id_of:
+    #         Maps item to its integer vertex id, assigned by add_vertex in insertion order.
+    #     - _item_of:
+    #         Maps integer vertex id back to its item.
+    #     - _by_kind:
+    #         Maps each vertex kind to the set of items of that kind.
+    #     - _csr:
+    #         The adjacency and appearances of this graph in CSR form while it is frozen, or None while they live in
+    #         the neighbours and appearances sets of the vertices instead.
+    #     - _movies:
+    #         The movies passed to add_appearances, with their ids and the values they are filtered by.
+    #     - _caches:
+    #         The results computed from this graph since it was last mutated, or None if there are none yet.
     _vertices: dict[Any, _Vertex]
+    _id_of: dict[Any, int]
+    _item_of: list[Any]
+    _by_kind: dict[str, set]
+    _csr: _CSR | None
+    _movies: _MovieIndex
+    _caches: _Caches | None
 
     def __init__(self) -> None:
         """Initialize an empty graph (no vertices or edges)."""
         self._vertices = {}
+        self._id_of = {}
+        self._item_of = []
+        self._by_kind = {'actor': set(), 'movie': set()}
+        self._csr = None
+        self._movies = _MovieIndex()
+        self._caches = None
+
+    def freeze(self) -> None:
+        """Pack the adjacency of this graph into CSR arrays and discard the per-vertex neighbour sets.
+
+        The searching methods of this graph freeze it automatically, so calling this directly is only needed
+        to control when the packing cost is paid. Do nothing if this graph is already frozen.
+        """
+        self._packed()
+
+    def _packed(self) -> _CSR:
+        """Return the CSR arrays of this graph, freezing it first if it is not frozen."""
+        if self._csr is None:
+            # Ids are assigned in insertion order and vertices are never removed, so this lists them by id.
+            vertices = list(self._vertices.values())
+
+            id_of, movie_id = self._id_of, self._movies.movie_id
+            self._csr = _CSR([[id_of[u.item] for u in v.neighbours] for v in vertices],
+                             [[movie_id[m] for m in v.appearances] for v in vertices],
+                             len(self._movies.movie_of))
+
+            for vertex in vertices:
+                vertex.neighbours = set()
+                vertex.appearances = set()
+
+        return self._csr
+
+    def _thaw(self) -> None:
+        """Discard the caches of this graph and, if it is frozen, rebuild the per-vertex neighbour and appearance
+        sets from the CSR arrays so that it can be mutated. Every method that mutates this graph calls this first.
+        """
+        self._caches = None
+        if self._csr is None:
+            return
+
+        csr = self._csr
+        vertices = [self._vertices[item] for item in self._item_of]
+        indptr, indices = csr.indptr.tolist(), csr.indices.tolist()
+        app_indptr, app_indices = csr.app_indptr.tolist(), csr.app_indices.tolist()
+        for i, v in enumerate(vertices):
+            v.neighbours = {vertices[j] for j in indices[indptr[i]:indptr[i + 1]]}
+            v.appearances = {self._movies.movie_of[m] for m in app_indices[app_indptr[i]:app_indptr[i + 1]]}
+
+        self._csr = None
+
+    def _cache(self) -> _Caches:
+        """Return the caches of this graph, creating them if it has been mutated since they were last used."""
+        if self._caches is None:
+            self._caches = _Caches()
+        return self._caches
+
+    def _neighbour_ids(self, i: int) -> list[int]:
+        """Return the ids of the neighbours of the vertex with id i, freezing this graph first."""
+        csr = self._packed()
+        return csr.indices[csr.indptr[i]:csr.indptr[i + 1]].tolist()
+
+    def _appearance_ids(self, i: int) -> list[int]:
+        """Return the ids of the movies the vertex with id i appeared in, freezing this graph first."""
+        csr = self._packed()
+        return csr.app_indices[csr.app_indptr[i]:csr.app_indptr[i + 1]].tolist()
+
+    def _common_movie_ids(self, i1: int, i2: int) -> np.ndarray:
+        """Return the sorted ids of the movies both the vertices with ids i1 and i2 appeared in."""
+        csr = self._packed()
+        app_indptr, app_indices = csr.app_indptr, csr.app_indices
+        return sorted_intersect(app_indices[app_indptr[i1]:app_indptr[i1 + 1]],
+                                app_indices[app_indptr[i2]:app_indptr[i2 + 1]])
 
     def add_vertex(self, item: Any, kind: str) -> None:
         """Add a vertex with the given item and kind to this graph.
@@ -79,7 +279,11 @@ class Graph:
             - kind in {'actor', 'movie'}
         """
         if item not in self._vertices:
+            self._thaw()
             self._vertices[item] = _Vertex(item, kind)
+            self._id_of[item] = len(self._item_of)
+            self._item_of.append(item)
+            self._by_kind[kind].add(item)
 
     def add_edge(self, item1: Any, item2: Any) -> None:
         """Add an edge between the two vertices with the given items in this graph.
@@ -90,6 +294,7 @@ class Graph:
             - item1 != item2
         """
         if item1 in self._vertices and item2 in self._vertices:
+            self._thaw()
             v1 = self._vertices[item1]
             v2 = self._vertices[item2]
 
@@ -98,14 +303,60 @@ class Graph:
         else:
             raise ValueError
 
+    def add_edges_bulk(self, cliques: Iterable[Iterable[Any]]) -> None:
+        """Add an edge between every two distinct items in each of the given groups of items.
+
+        This has the same result as calling add_edge on every such pair, but the edges are generated and merged
+        into the CSR arrays all at once, leaving this graph frozen.
+
+        Raise a ValueError if any of the items do not appear as vertices in this graph.
+
+        >>> g = Graph()
+        >>> for actor in ['actor1', 'actor2', 'actor3', 'actor4']:
+        ...     g.add_vertex(actor, kind = 'actor')
+        >>> g.add_edge('actor1', 'actor4')
+        >>> g.add_edges_bulk([['actor1', 'actor2', 'actor3'], ['actor3', 'actor4']])
+        >>> g.get_neighbours('actor1') == {'actor2', 'actor3', 'actor4'}
+        True
+        >>> g.get_neighbours('actor4') == {'actor1', 'actor3'}
+        True
+        """
+        try:
+            rows = [[self._id_of[item] for item in clique] for clique in cliques]
+        except KeyError as exc:
+            raise ValueError(f"{exc.args[0]} does not appear as a vertex in this graph.") from exc
+
+        csr = self._packed()
+        src, dst = clique_edges(*pack_rows(rows))
+
+        # Merge with the existing edges, encoding each edge (u, v) as u * n + v so that sorting and removing
+        # duplicates leaves every row sorted.
+        n = len(self._item_of)
+        old_src = np.repeat(np.arange(n, dtype=np.int64), np.diff(csr.indptr))
+        keys = np.concatenate((old_src * n + csr.indices, src.astype(np.int64) * n + dst))
+        keys.sort()
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+        keys = keys[keys // n != keys % n]
+
+        csr.indptr = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(keys // n, minlength=n), out=csr.indptr[1:])
+        csr.indices = (keys % n).astype(np.int32)
+        self._caches = None
+
     def adjacent(self, item1: Any, item2: Any) -> bool:
         """Return whether item1 and item2 are adjacent vertices in this graph.
 
         Return False if item1 or item2 do not appear as vertices in this graph.
+
+        While the graph is being built, this is a set lookup that does not freeze the graph.
         """
         if item1 in self._vertices and item2 in self._vertices:
-            v1 = self._vertices[item1]
-            return any(v2.item == item2 for v2 in v1.neighbours)
+            if self._csr is None:
+                return self._vertices[item2] in self._vertices[item1].neighbours
+            i1, i2 = self._id_of[item1], self._id_of[item2]
+            row = self._csr.indices[self._csr.indptr[i1]:self._csr.indptr[i1 + 1]]
+            j = np.searchsorted(row, i2)
+            return bool(j < row.size and row[j] == i2)
         else:
             return False
 
@@ -117,36 +368,71 @@ class Graph:
         Raise a ValueError if item does not appear as a vertex in this graph.
         """
         if item in self._vertices:
-            v = self._vertices[item]
-            return {neighbour.item for neighbour in v.neighbours}
+            return {self._item_of[j] for j in self._neighbour_ids(self._id_of[item])}
         else:
             raise ValueError
 
-    def get_all_vertices(self, kind: str = '') -> set:
+    def get_all_vertices(self, kind: str = '') -> set | frozenset:
         """Return a set of all vertex items in this graph.
 
-        If kind != '', only return the items of the given vertex kind.
+        If kind != '', only return the items of the given vertex kind, as a frozenset that is cached until this
+        graph is next mutated.
 
         Preconditions:
             - kind in {'', 'actor', 'movie'}
         """
         if kind != '':
-            return {v.item for v in self._vertices.values() if v.kind == kind}
+            by_kind = self._cache().by_kind
+            if kind not in by_kind:
+                by_kind[kind] = frozenset(self._by_kind[kind])
+            return by_kind[kind]
         else:
             return set(self._vertices.keys())
 
     def get_vertices(self) -> dict:
-        """Return the dictionary of vertices in the graph."""
+        """Return the dictionary of vertices in the graph.
+
+        The graph is thawed first, so the neighbours sets of the returned vertices are populated.
+        """
+        self._thaw()
         return self._vertices
 
     def add_appearances(self, actor: str, movie: str) -> None:
         """Adds a movie the actor has appeared in to a set.
         Raise a ValueError if actor does not appear as a vertex in this graph."""
         if actor in self._vertices:
+            self._thaw()
+            if movie not in self._movies.movie_id:
+                self._movies.movie_id[movie] = len(self._movies.movie_of)
+                self._movies.movie_of.append(movie)
+                self._movies.source = None
             self._vertices[actor].appearances.add(movie)
         else:
             raise ValueError
 
+    def index_movies(self, movies: dict) -> None:
+        """Precompute the value of every key in MOVIE_INFO_INDEX for every movie in this graph from the given
+        movies dictionary, as NumPy arrays indexed by movie id.
+
+        Movies in this graph that are missing from movies get NaN for every key, so no filter accepts them.
+
+        The filtered searches call this themselves the first time they are given a movies dictionary, but cannot
+        tell when that dictionary is mutated in place: call this again after changing it.
+        """
+        columns = {column: np.full(len(self._movies.movie_of), np.nan) for column in MOVIE_INFO_INDEX}
+        for movie, mid in self._movies.movie_id.items():
+            if movie in movies:
+                info = movies[movie][1]
+                for key, i in MOVIE_INFO_INDEX.items():
+                    columns[key][mid] = float(info[i])
+
+        self._movies.columns = columns
+        self._movies.masks = {}
+        self._movies.source = movies
+        if self._caches is not None:
+            paths = self._caches.paths
+            self._caches.paths = {cache_key: path for cache_key, path in paths.items() if len(cache_key) == 2}
+
     def add_sim_score(self, movie: str, sim_scores: dict) -> None:
         """Adds a movie's similarity score from a given dictionary.
 
@@ -164,6 +450,9 @@ class Graph:
     def get_common_movies(self, item1: str, item2: str) -> set:
         """Returns the movie(s) that are in common between two actors
 
+        The result is cached until this graph is next mutated, since the same pairs are looked up again each time
+        a path is printed or displayed.
+
         Raise a ValueError if item1 or item2 do not appear as vertices in this graph.
 
         >>> g = Graph()
@@ -180,9 +469,12 @@ class Graph:
         True
         """
         if item1 in self._vertices and item2 in self._vertices:
-            v1 = self._vertices[item1]
-            v2 = self._vertices[item2]
-            return v1.appearances.intersection(v2.appearances)
+            common_movies = self._cache().common_movies
+            i1, i2 = sorted((self._id_of[item1], self._id_of[item2]))
+            if (i1, i2) not in common_movies:
+                common = self._common_movie_ids(i1, i2).tolist()
+                common_movies[(i1, i2)] = frozenset(self._movies.movie_of[m] for m in common)
+            return set(common_movies[(i1, i2)])
         else:
             raise ValueError
 
@@ -192,7 +484,7 @@ class Graph:
         Preconditions:
         - actor in self._vertices
         """
-        return self._vertices[actor].appearances
+        return {self._movies.movie_of[m] for m in self._appearance_ids(self._id_of[actor])}
 
     def get_random_item(self) -> Any:
         """Returns the item of a random vertex
@@ -230,67 +522,101 @@ class Graph:
         if starting_item not in self._vertices or target_item not in self._vertices:
             raise ValueError
 
-        queue = deque([(starting_item, [starting_item])])
-        visited = {starting_item}
+        csr = self._packed()
+        paths = self._cache().paths
+        cache_key = (self._id_of[starting_item], self._id_of[target_item])
+        if cache_key not in paths:
+            self._remember_path(cache_key, bfs_path(csr.indptr, csr.indices, cache_key[0], cache_key[1],
+                                                    len(self._item_of)))
 
-        while queue:
-            current_actor, path = queue.popleft()
+        return [self._item_of[i] for i in paths[cache_key]]
 
-            if current_actor == target_item:
-                return path
+    def shortest_distance_to(self, starting_item: str, target_item: str) -> int:
+        """Return the length of a shortest path between two actors, or UNREACHED (-1) if there is none.
 
-            for neighbour in self._vertices[current_actor].neighbours:
-                if neighbour.item not in visited:
-                    visited.add(neighbour.item)
-                    queue.append((neighbour.item, path + [neighbour.item]))
+        The search runs from both actors and stops as soon as the two sides meet, rather than reaching every
+        vertex connected to starting_item.
+
+        Raise a ValueError if starting_item or target_item do not appear as vertices in this graph.
 
-        return []
+        >>> g = Graph()
+        >>> g.add_vertex('actor1', kind = 'actor')
+        >>> g.add_vertex('actor2', kind = 'actor')
+        >>> g.add_vertex('actor3', kind = 'actor')
+        >>> g.add_edge('actor1','actor2')
+        >>> g.shortest_distance_to('actor2', 'actor1')
+        1
+        >>> g.shortest_distance_to('actor1', 'actor3')
+        -1
+        """
+        return len(self.shortest_path_bfs(starting_item, target_item)) - 1
 
     def shortest_path_bfs_filtered(self, items: tuple[str, str], key: str,
                                    thresholds: tuple[float, float], movies: dict) -> str | list[Any]:
         """Find the shortest path between two actors using BFS where actors can only be included in the path
         if they match the filtering requirements.
 
+        Two consecutive actors on the path must have appeared together in a movie whose key lies within the
+        thresholds. Rather than intersecting the appearances of every pair of actors, the search steps from an
+        actor through each of their movies that passes the filter to that movie's cast.
+
+        The movie values are read from movies once and kept, so call index_movies after mutating movies.
+
         Raise a ValueError if starting_item or target_item do not appear as vertices in this graph.
+
+        >>> g = Graph()
+        >>> g.add_vertex('actor1', kind = 'actor')
+        >>> g.add_vertex('actor2', kind = 'actor')
+        >>> g.add_vertex('actor3', kind = 'actor')
+        >>> g.add_edge('actor1','actor2')
+        >>> g.add_edge('actor2','actor3')
+        >>> g.add_edge('actor1','actor3')
+        >>> g.add_appearances('actor1','movie1')
+        >>> g.add_appearances('actor2','movie1')
+        >>> g.add_appearances('actor2','movie2')
+        >>> g.add_appearances('actor3','movie2')
+        >>> g.add_appearances('actor1','movie3')
+        >>> g.add_appearances('actor3','movie3')
+        >>> test_movies = {'movie1': [[], [1970, [], 2.0]], 'movie2': [[], [1980, [], 1.0]], \
+         'movie3': [[], [1990, [], 2.5]]}
+        >>> g.shortest_path_bfs_filtered(('actor1', 'actor3'), 'release date', (1965, 1985), test_movies)
+        ['actor1', 'actor2', 'actor3']
+        >>> g.shortest_path_bfs_filtered(('actor1', 'actor3'), 'rating', (2.0, 3.0), test_movies)
+        ['actor1', 'actor3']
+        >>> g.shortest_path_bfs_filtered(('actor1', 'actor3'), 'rating', (3.0, 4.0), test_movies)
+        []
         """
         lower, upper = thresholds[0], thresholds[1]
         starting_item, target_item = items[0], items[1]
         if starting_item not in self._vertices or target_item not in self._vertices:
             raise ValueError("One or both actors are not in the graph.")
 
-        queue = deque([(starting_item, [starting_item])])
-        visited = {starting_item}
-
-        while queue:
-            current_actor, path = queue.popleft()
-
-            if current_actor == target_item:
-                return path
-
-            for neighbour in self._vertices[current_actor].neighbours:
-                if neighbour.item not in visited:
-                    is_valid, _ = self.filter_by_key((current_actor, neighbour.item),
-                                                     key, (lower, upper), movies)
-                    self._sp_bfs_filtered_helper(is_valid, visited, neighbour.item, (queue, path))
-                    # if is_valid:
-                    #     visited.add(neighbour.item)
-                    #     queue.append((neighbour.item, path + [neighbour.item]))
-
-        return []
-
-    @staticmethod
-    def _sp_bfs_filtered_helper(is_valid: bool, visited: set, item: Any,
-                                queue_path: tuple[deque, list[str]]) -> None:
-        """A helper function for shortest_path_bfs_filtered
-        If is valid_is True, adds item to visited and appends (item, path + [item]) to queue."""
-        queue = queue_path[0]
-        path = queue_path[1]
-        if is_valid:
-            visited.add(item)
-            queue.append((item, path + [item]))
-
-    def shortest_distance_bfs(self, starting_item: str) -> dict[Any, float]:
+        movie_ok = self._movie_mask(key, (lower, upper), movies)
+
+        csr = self._packed()
+        paths = self._cache().paths
+        cache_key = (self._id_of[starting_item], self._id_of[target_item], key, lower, upper)
+        if cache_key not in paths:
+            self._remember_path(cache_key, bfs_path_via_movies(
+                csr.app_indptr, csr.app_indices, csr.cast_indptr, csr.cast_indices, movie_ok,
+                cache_key[0], cache_key[1], len(self._item_of)))
+
+        return [self._item_of[i] for i in paths[cache_key]]
+
+    def _remember_path(self, cache_key: tuple, path: np.ndarray) -> None:
+        """Store the given path of vertex ids in the path cache under cache_key, forgetting the oldest stored path
+        first if there are already PATH_CACHE_SIZE of them.
+        """
+        paths = self._cache().paths
+        if len(paths) >= PATH_CACHE_SIZE:
+            del paths[next(iter(paths))]
+        paths[cache_key] = tuple(path.tolist())
+
+    def shortest_distance_bfs(self, starting_item: str) -> dict[Any, int]:
         """Compute the shortest distance from a given actor to all other actors using BFS.
+
+        Only the vertices reachable from starting_item are included, and starting_item itself is left out.
+
         Raise a ValueError if starting_item does not appear as vertices in this graph.
 
         >>> g = Graph()
@@ -319,28 +645,289 @@ class Graph:
         if starting_item not in self._vertices:
             raise ValueError
 
-        distances = {actor: float("inf") for actor in self._vertices}
-        distances[starting_item] = 0
+        csr = self._packed()
+        source = self._id_of[starting_item]
+        distances = bfs_distances(csr.indptr, csr.indices, source, len(self._item_of))
+        reached = np.flatnonzero(distances > 0).tolist()
+
+        return {self._item_of[i]: dist for i, dist in zip(reached, distances[reached].tolist())}
 
-        queue = deque([starting_item])
-        visited = {starting_item}
+    def precompute_distances_from(self, item: Any) -> None:
+        """Run a single BFS from the vertex with the given item and keep the distances from it to every vertex,
+        so that precomputed_distance can answer queries involving it without searching.
 
-        while queue:
-            current_actor = queue.popleft()
+        The distances are kept until this graph is next mutated.
+
+        Raise a ValueError if item does not appear as a vertex in this graph.
+        """
+        if item not in self._vertices:
+            raise ValueError
 
-            for neighbour in self._vertices[current_actor].neighbours:
-                if neighbour.item != starting_item and neighbour.item not in visited:
-                    visited.add(neighbour.item)
-                    distances[neighbour.item] = distances[current_actor] + 1
-                    queue.append(neighbour.item)
+        csr = self._packed()
+        distances = self._cache().distances
+        if item not in distances:
+            distances[item] = bfs_distances(csr.indptr, csr.indices, self._id_of[item], len(self._item_of))
 
-        # Remove the starting actor
-        return {actor: dist for actor, dist in distances.items() if actor != starting_item}
+    def save_distance_matrix(self, path: str) -> None:
+        """Compute the length of a shortest path between every two vertices of this graph and save them to the
+        .npy file at path, as an int16 matrix with UNREACHED (-1) for pairs with no path.
+
+        The items the rows and columns stand for are saved, in order, to path + '.graph.npz', along with the edges
+        of this graph and SAVE_FORMAT_VERSION. The saved matrix is then memory-mapped as by load_distance_matrix.
+        """
+        csr = self._packed()
+        n = len(self._item_of)
+        matrix = np.lib.format.open_memmap(path, mode='w+', dtype=np.int16, shape=(n, n))
+        all_distances(csr.indptr, csr.indices, matrix)
+        matrix.flush()
+        del matrix
+        np.savez(path + '.graph.npz', version=SAVE_FORMAT_VERSION, items=np.array(self._item_of, dtype=str),
+                 indptr=csr.indptr, indices=csr.indices)
+        self.load_distance_matrix(path)
+
+    def load_distance_matrix(self, path: str) -> None:
+        """Memory-map the distance matrix saved by save_distance_matrix at path, so that precomputed_distance
+        and bacon_numbers_from answer every query from it until this graph is next mutated.
+
+        Raise a ValueError if the matrix was not saved with the current SAVE_FORMAT_VERSION from a graph with exactly
+        the same vertices and edges as this one.
+        """
+        error = ValueError(f"The distance matrix in {path} does not match this graph.")
+        if not os.path.exists(path + '.graph.npz'):
+            raise error
+        matrix = np.load(path, mmap_mode='r')
+        with np.load(path + '.graph.npz') as saved:
+            if int(saved['version']) != SAVE_FORMAT_VERSION:
+                raise error
+            items = np.asarray(saved['items']).tolist()
+            saved_indptr, saved_indices = saved['indptr'], saved['indices']
+
+        row_of = {item: row for row, item in enumerate(items)}
+        if len(row_of) != len(self._item_of) or matrix.shape != (len(row_of), len(row_of)) \
+                or any(item not in row_of for item in self._item_of) \
+                or not self._same_edges(items, saved_indptr, saved_indices):
+            raise error
+
+        self._cache().matrix = (matrix, np.array([row_of[item] for item in self._item_of], dtype=np.int64))
+
+    def _same_edges(self, items: list, indptr: np.ndarray, indices: np.ndarray) -> bool:
+        """Return whether the CSR arrays indptr and indices, whose vertex ids stand for the given items, hold exactly
+        the edges of this graph.
+
+        Preconditions:
+            - sorted(items) == sorted(self._item_of)
+        """
+        csr = self._packed()
+        ids = np.array([self._id_of[item] for item in items], dtype=np.int64)
+        degrees = np.diff(indptr)
+        if not np.array_equal(degrees, np.diff(csr.indptr)[ids]):
+            return False
+
+        # Translate the saved rows to this graph's ids, sort each row, and compare them with this graph's rows
+        # gathered in the same order.
+        rows = np.repeat(np.arange(len(items)), degrees)
+        translated = ids[indices]
+        translated = translated[np.lexsort((translated, rows))]
+        offsets = np.arange(indices.size) - np.repeat(indptr[:-1], degrees)
+        own = csr.indices[np.repeat(csr.indptr[ids], degrees) + offsets]
+        return bool(np.array_equal(translated, own))
+
+    def precomputed_distance(self, item1: Any, item2: Any) -> int | None:
+        """Return the length of a shortest path between item1 and item2 if the distances from either of them
+        have been precomputed, or a distance matrix is loaded, or None otherwise.
+
+        Return UNREACHED (-1) if there is no path between them.
+
+        Preconditions:
+            - item1 in self._vertices and item2 in self._vertices
+
+        >>> g = Graph()
+        >>> g.add_vertex('actor1', kind = 'actor')
+        >>> g.add_vertex('actor2', kind = 'actor')
+        >>> g.add_vertex('actor3', kind = 'actor')
+        >>> g.add_edge('actor1','actor2')
+        >>> g.precompute_distances_from('actor2')
+        >>> g.precomputed_distance('actor1', 'actor2')
+        1
+        >>> g.precomputed_distance('actor2', 'actor3')
+        -1
+        >>> g.precomputed_distance('actor1', 'actor3') is None
+        True
+        """
+        cache = self._cache()
+        if cache.matrix is not None:
+            matrix, rows = cache.matrix
+            return int(matrix[rows[self._id_of[item1]], rows[self._id_of[item2]]])
+        elif item1 in cache.distances:
+            return int(cache.distances[item1][self._id_of[item2]])
+        elif item2 in cache.distances:
+            return int(cache.distances[item2][self._id_of[item1]])
+        else:
+            return None
+
+    def bacon_numbers_from(self, source: Any, targets: list) -> list[int]:
+        """Return the length of a shortest path from source to each of the given targets, in order, or
+        UNREACHED (-1) for the targets that cannot be reached.
+
+        A single BFS from source answers every target (none if the distances from source were precomputed or a
+        distance matrix is loaded), so this is the preferred way to query many targets from the same source.
+
+        Raise a ValueError if source or any of the targets do not appear as vertices in this graph.
+
+        >>> g = Graph()
+        >>> g.add_vertex('actor1', kind = 'actor')
+        >>> g.add_vertex('actor2', kind = 'actor')
+        >>> g.add_vertex('actor3', kind = 'actor')
+        >>> g.add_vertex('actor4', kind = 'actor')
+        >>> g.add_edge('actor1','actor2')
+        >>> g.add_edge('actor2','actor3')
+        >>> g.bacon_numbers_from('actor1', ['actor3', 'actor1', 'actor4'])
+        [2, 0, -1]
+        """
+        if source not in self._vertices or any(target not in self._vertices for target in targets):
+            raise ValueError
+
+        csr = self._packed()
+        cache = self._cache()
+        ids = np.fromiter((self._id_of[target] for target in targets), dtype=np.int64, count=len(targets))
+        if cache.matrix is not None:
+            matrix, rows = cache.matrix
+            return matrix[rows[self._id_of[source]]][rows[ids]].tolist()
+        elif source in cache.distances:
+            distances = cache.distances[source]
+        else:
+            distances = bfs_distances(csr.indptr, csr.indices, self._id_of[source], len(self._item_of))
+
+        return distances[ids].tolist()
+
+    def _movie_values(self, key: str, movies: dict) -> np.ndarray:
+        """Return the array of the given key of every movie in this graph, indexed by movie id.
+
+        The arrays are rebuilt from movies if they were built from a different dictionary or are stale. Changes
+        made to the same dictionary in place are only picked up by calling index_movies again.
+
+        Raise a KeyError if key is not in MOVIE_INFO_INDEX.
+        """
+        if movies is not self._movies.source:
+            self.index_movies(movies)
+
+        return self._movies.columns[key]
+
+    def _movie_mask(self, key: str, thresholds: tuple[float, float], movies: dict) -> np.ndarray:
+        """Return a boolean array indexed by movie id that is True exactly for the movies whose key lies within
+        the thresholds (inclusive).
+
+        Raise a KeyError if key is not in MOVIE_INFO_INDEX.
+        """
+        values = self._movie_values(key, movies)
+        cache_key = (key, thresholds[0], thresholds[1])
+        masks = self._movies.masks
+        if cache_key not in masks:
+            masks[cache_key] = (thresholds[0] <= values) & (values <= thresholds[1])
+        return masks[cache_key]
+
+    def _kind_mask(self, kind: str) -> np.ndarray:
+        """Return a boolean array indexed by vertex id that is True exactly for the vertices of the given kind."""
+        kind_masks = self._cache().kind_masks
+        if kind not in kind_masks:
+            mask = np.zeros(len(self._item_of), dtype=np.bool_)
+            mask[np.fromiter((self._id_of[item] for item in self._by_kind[kind]), dtype=np.int64)] = True
+            kind_masks[kind] = mask
+        return kind_masks[kind]
+
+    def average_distance(self, item: Any) -> float:
+        """Return the mean shortest distance from the vertex with the given item to every other vertex of the
+        same kind that it can reach, or infinity if it can reach none.
+
+        The result is cached until this graph is next mutated.
+
+        Preconditions:
+            - item in self._vertices
+
+        >>> g = Graph()
+        >>> g.add_vertex('actor1', kind = 'actor')
+        >>> g.add_vertex('actor2', kind = 'actor')
+        >>> g.add_vertex('actor3', kind = 'actor')
+        >>> g.add_edge('actor1','actor2')
+        >>> g.add_edge('actor2','actor3')
+        >>> g.average_distance('actor1')
+        1.5
+        >>> g.add_vertex('actor4', kind = 'actor')
+        >>> g.add_edge('actor3','actor4')
+        >>> g.average_distance('actor1')
+        2.0
+        """
+        csr = self._packed()
+        averages = self._cache().averages
+        if item not in averages:
+            dist = bfs_distances(csr.indptr, csr.indices, self._id_of[item], len(self._item_of))
+
+            # Every distance other than the source's 0 and UNREACHED is positive.
+            reached = dist[(dist > 0) & self._kind_mask(self._vertices[item].kind)]
+            averages[item] = float(reached.sum() / reached.size) if reached.size > 0 else float('inf')
+
+        return averages[item]
+
+    def average_distances(self, kind: str = 'actor') -> dict[Any, float]:
+        """Return a dictionary mapping every vertex item of the given kind to the mean shortest distance from it
+        to every other vertex of that kind it can reach (infinity if it can reach none).
+
+        Every vertex of the given kind that is not already cached is searched from, 64 at a time with a
+        bit-parallel BFS, in parallel across all available cores. The results are cached until this graph is next
+        mutated.
+
+        Preconditions:
+            - kind in {'actor', 'movie'}
+
+        >>> g = Graph()
+        >>> g.add_vertex('actor1', kind = 'actor')
+        >>> g.add_vertex('actor2', kind = 'actor')
+        >>> g.add_vertex('actor3', kind = 'actor')
+        >>> g.add_vertex('actor4', kind = 'actor')
+        >>> g.add_edge('actor1','actor2')
+        >>> g.add_edge('actor2','actor3')
+        >>> g.average_distances() == {'actor1': 1.5, 'actor2': 1.0, 'actor3': 1.5, 'actor4': float('inf')}
+        True
+        """
+        csr = self._packed()
+        cached = self._cache().averages
+        items = self._by_kind[kind]
+        missing = [self._id_of[item] for item in items if item not in cached]
+
+        if missing:
+            kind_mask = self._kind_mask(kind)
+            sources = np.zeros(len(self._item_of), dtype=np.bool_)
+            sources[missing] = True
+            averages = all_bacon_avgs(csr.indptr, csr.indices, kind_mask, sources, len(self._item_of))
+            for i in missing:
+                cached[self._item_of[i]] = float(averages[i])
+
+        return {item: cached[item] for item in items}
+
+    def remember_averages(self, averages: dict[Any, float]) -> None:
+        """Seed the cache used by average_distance and average_distances with the given precomputed averages,
+        e.g. ones loaded from a file written for this same graph. Items that are not vertices of this graph are
+        ignored.
+
+        Like computed averages, they are discarded when this graph is next mutated, whether or not it is frozen.
+
+        >>> g = Graph()
+        >>> g.add_vertex('actor1', kind = 'actor')
+        >>> g.remember_averages({'actor1': 2.5, 'actor2': 1.0})
+        >>> g.average_distance('actor1')
+        2.5
+        >>> g.add_vertex('actor2', kind = 'actor')
+        >>> g.average_distance('actor1')
+        inf
+        """
+        self._cache().averages.update((item, avg) for item, avg in averages.items() if item in self._vertices)
 
     def filter_by_key(self, actors: tuple[str, str], key: str,
                       thresholds: tuple[float, float], movies: dict) -> tuple[bool, set[str]] | None:
         """Checks if two actors have a movie connecting them that matches the given filter.
 
+        The movie values are read from movies once and kept, so call index_movies after mutating movies.
+
         Raise a KeyError if key is not 'release date' or 'rating'.
 
         Raise a ValueError if actor1 or actor2 do not appear as vertices in this graph.
@@ -388,23 +975,11 @@ class Graph:
         lower, upper = thresholds[0], thresholds[1]
         actor1, actor2 = actors[0], actors[1]
         if actor1 in self._vertices and actor2 in self._vertices:
-            v1 = self._vertices[actor1]
-            v2 = self._vertices[actor2]
-
-            if key == 'release date':
-                common = v1.appearances.intersection(v2.appearances)
-                common_filtered = {movie for movie in common if lower <= float(movies[movie][1][0]) <= upper}
-                if common_filtered:
-                    return True, common_filtered
-
-            elif key == 'rating':
-                common = v1.appearances.intersection(v2.appearances)
-                common_filtered = {movie for movie in common if lower <= float(movies[movie][1][2]) <= upper}
-                if common_filtered:
-                    return True, common_filtered
-
-            else:
-                raise KeyError
+            movie_ok = self._movie_mask(key, (lower, upper), movies)
+            common = self._common_movie_ids(self._id_of[actor1], self._id_of[actor2]).tolist()
+            common_filtered = {self._movies.movie_of[m] for m in common if movie_ok[m]}
+            if common_filtered:
+                return True, common_filtered
 
         else:
             raise ValueError
@@ -418,7 +993,7 @@ if __name__ == '__main__':
 
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['collections', 'random'],  # the names (strs) of imported modules
+        'extra-imports': ['os', 'random', 'numpy', 'calculations_fast'],  # the names (strs) of imported modules
         'allowed-io': [],  # the names (strs) of functions that call print/open/input
         'max-line-length': 120
     })
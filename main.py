@@ -6,6 +6,7 @@ This project was created by Skye Mah-Madjar, Krisztian Drimba, Joshua Iaboni, an
 This file is Copyright (c) 2025 Skye Mah-Madjar, Krisztian Drimba, Joshua Iaboni, and Xiayu Lyu.
 """
 
+import argparse
 import graph_create
 import graph_display
 import calculations
@@ -15,16 +16,44 @@ if __name__ == '__main__':
     import python_ta
 
     python_ta.check_all(config={
-        'extra-imports': ['graph_entities', 'graph_create', 'graph_display', 'calculations'],
+        'extra-imports': ['argparse', 'graph_entities', 'graph_create', 'graph_display', 'calculations'],
         'allowed-io': [],
         'max-line-length': 120
     })
 
-    actor_graph, movie_dict = graph_create.initialize_graphs('Datasets/full_dataset.csv')
+    parser = argparse.ArgumentParser(description='HAM and Bacon')
+    parser.add_argument('--precompute-source', nargs='+', metavar='NAME',
+                        help='an actor (e.g. Kevin Bacon) whose Bacon numbers are computed once at startup')
+    parser.add_argument('--distance-matrix', metavar='FILE',
+                        help='a .npy file holding the Bacon number of every pair of actors, which is computed and '
+                             'saved there (with the graph it was computed from in FILE.graph.npz) first if it does '
+                             'not exist or was computed from a different graph')
+    parser.add_argument('--graph-cache', metavar='FILE',
+                        help='a pickle file the loaded dataset is saved to, and loaded from on later runs until the '
+                             'dataset changes')
+    args = parser.parse_args()
+
+    if args.graph_cache is not None:
+        actor_graph, movie_dict = graph_create.initialize_graphs_cached('Datasets/full_dataset.csv', args.graph_cache)
+    else:
+        actor_graph, movie_dict = graph_create.initialize_graphs('Datasets/full_dataset.csv')
+    if args.distance_matrix is not None:
+        try:
+            actor_graph.load_distance_matrix(args.distance_matrix)
+        except (FileNotFoundError, ValueError):
+            actor_graph.save_distance_matrix(args.distance_matrix)
+    if args.precompute_source is not None:
+        precompute_source = ' '.join(args.precompute_source)
+        if not actor_graph.item_in_graph(precompute_source):
+            parser.error(f"--precompute-source: {precompute_source} is not an actor in our dataset")
+        actor_graph.precompute_distances_from(precompute_source)
+    movie_table = calculations.build_movie_table(movie_dict)
     average_bacon_numbers = graph_create.create_dict_from_csv('Datasets/average_bacon_numbers.csv')
+    actor_graph.remember_averages(average_bacon_numbers)
 
     # the meaningful numbers based on OUR dataset.
     average_bacon_numbers_meaningful = {actor: score for actor, score in average_bacon_numbers.items() if score > 1.5}
+    actor_rank = {actor: i + 1 for i, actor in enumerate(average_bacon_numbers_meaningful)}
 
     running = True
     menu = ['(1) Bacon Number Ranking', '(2) Average Bacon Number of an actor',
@@ -57,8 +86,11 @@ if __name__ == '__main__':
                     actor_name = str(input("Actor Name: ").strip())
             print("The Average Bacon Number for", actor_name, "is:", calculations.average_bacon_number(actor_graph,
                                                                                                        actor_name))
-            print("The actor is number", list(average_bacon_numbers_meaningful.keys()).index(actor_name) + 1, "out of",
-                  len(average_bacon_numbers_meaningful), "in the overall rankings.")
+            if actor_name in actor_rank:
+                print("The actor is number", actor_rank[actor_name],
+                      "out of", len(average_bacon_numbers_meaningful), "in the overall rankings.")
+            else:
+                print("The actor is not in the overall rankings.")
 
         if choice == '3':
             actor1_name = str(input("Actor 1 Name (or type RANDOM): ")).strip()
@@ -144,16 +176,17 @@ if __name__ == '__main__':
                 while not calculations.is_float(upper_threshold):
                     print("Invalid Choice, try Again")
                     upper_threshold = input("Upper bound for filtering: ").strip()
-                rec_result, sim_scores = calculations.get_recommendations(movie_dict, movie_name, int(movie_limit),
-                                                                          filter_key, (float(lower_threshold),
-                                                                          float(upper_threshold)))
+                rec_result, sim_scores = calculations.get_recommendations_from_table(
+                    movie_table, movie_name, int(movie_limit), filter_key,
+                    (float(lower_threshold), float(upper_threshold)))
                 if rec_result in [{}, []]:
                     print("There are no recommendations for this movie, possibly due to filtering.")
                 else:
                     print("Recommended Movies: ", rec_result)
 
             else:
-                rec_result, sim_scores = calculations.get_recommendations(movie_dict, movie_name, int(movie_limit))
+                rec_result, sim_scores = calculations.get_recommendations_from_table(movie_table, movie_name,
+                                                                                     int(movie_limit))
                 if rec_result in [{}, []]:
                     print("There are no recommendations for this movie.")
                 else: